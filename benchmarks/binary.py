@@ -0,0 +1,36 @@
+"""HTMLer Binary Serialization Benchmark
+
+Compares size of serialized trees of the benchmark suite cases, and time of serializing and restoring them with
+`htmler.dumps()`/`htmler.loads()` and with pickle.
+
+Usage: python benchmarks/binary.py
+"""
+import os
+import pickle
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import htmler
+from suite import CASES, measure
+
+
+def main():
+    for name, build in CASES.items():
+        doc = build(1)
+        print(name)
+        for label, dumps, loads in ('binary', htmler.dumps, htmler.loads), ('pickle', pickle.dumps, pickle.loads):
+            try:
+                data = dumps(doc)
+            except RecursionError:
+                print(f'    {label:>6}: too deep')
+                continue
+
+            dump_time = measure(lambda: dumps(doc), 5)
+            load_time = measure(lambda: loads(data), 5)
+            print(f'    {label:>6}: {len(data) / 1024:8.1f} KB, dump {dump_time * 1000:7.1f} ms, '
+                  f'load {load_time * 1000:7.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
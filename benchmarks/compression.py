@@ -0,0 +1,65 @@
+"""HTMLer Compressed Rendering Benchmark
+
+Compares time and peak memory allocated by Python of compressing a rendered document after the fact, with
+`gzip.compress(doc.render().encode())` and alike, and while rendering, with `render_compressed()`.
+
+Usage: python benchmarks/compression.py
+"""
+import bz2
+import gzip
+import lzma
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import htmler
+
+ROWS = 20000  # 5 nodes per row
+
+COMPRESS = {
+    'gzip': gzip.compress,
+    'bz2': bz2.compress,
+    'lzma': lzma.compress,
+}
+
+
+def build_tree() -> htmler.Table:
+    return htmler.Table(htmler.Tbody(*(
+        htmler.Tr(htmler.Td(f'Row #{i}'), htmler.Td(f'Some lengthy text of the row {i} to make the output large'))
+        for i in range(ROWS)
+    )))
+
+
+def measure(f) -> tuple:
+    """Get time of a call of a function, peak memory allocated while calling it and size of its result
+    """
+    started = time.perf_counter()
+    f()
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    try:
+        size = len(f())
+        return elapsed, tracemalloc.get_traced_memory()[1], size
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    doc = build_tree()
+    print(f'Uncompressed: {len(doc.render().encode()) / 1024 / 1024:.1f} MB')
+
+    for codec, compress in COMPRESS.items():
+        for label, f in (
+            ('after', lambda: compress(doc.render().encode())),
+            ('streamed', lambda: doc.render_compressed(codec)),
+        ):
+            elapsed, peak, size = measure(f)
+            print(f'{codec:>5} {label:>8}: {size / 1024:8.1f} KB in {elapsed:.3f}s, peak {peak / 1024 / 1024:6.1f} MB')
+
+
+if __name__ == '__main__':
+    main()
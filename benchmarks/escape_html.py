@@ -0,0 +1,44 @@
+"""HTMLer escape_html() Benchmark
+
+Compares the chained `str.replace()` implementation escape_html() used to have with the current pure Python and C
+(if built) implementations on short, long, clean and dirty strings.
+
+Usage: python benchmarks/escape_html.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from htmler import base
+
+NUMBER = 20000
+
+STRINGS = {
+    'short clean': 'Hello World',
+    'short dirty': 'a < b & "c"',
+    'long clean': 'Lorem ipsum dolor sit amet, consectetur adipiscing elit. ' * 50,
+    'long dirty': 'Lorem <b>ipsum</b> dolor & "sit" amet, it\'s consectetur. ' * 50,
+}
+
+
+def escape_html_chained(s: str) -> str:
+    return s.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace('"', "&quot;")
+
+
+def main():
+    impls = {'chained': escape_html_chained, 'python': base._escape_html_py}
+    if base.escape_html is not base._escape_html_py:
+        impls['c'] = base.escape_html
+    else:
+        print('C extension is not built, run "python setup.py build_ext --inplace" to build it')
+
+    print(f'{"":>12}' + ''.join(f'{name:>12}' for name in impls) + '   (usec per call)')
+    for title, s in STRINGS.items():
+        times = [timeit.timeit(lambda: f(s), number=NUMBER) / NUMBER * 1e6 for f in impls.values()]
+        print(f'{title:>12}' + ''.join(f'{t:12.3f}' for t in times))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""HTMLer get_element_by_id() Benchmark
+
+Compares lookups in the ID index with the recursive depth-first search get_element_by_id() used to do, on a large
+form.
+
+Usage: python benchmarks/get_element_by_id.py
+"""
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import htmler
+
+FIELDSETS = 50
+FIELDS = 40
+LOOKUPS = 500
+
+
+def build_form() -> htmler.Form:
+    return htmler.Form(*(
+        htmler.Fieldset(
+            htmler.Legend(f'Group {i}'),
+            *(htmler.Div(htmler.Label(f'Field {j}', label_for=f'f-{i}-{j}'), htmler.Input(id=f'f-{i}-{j}'), css='row')
+              for j in range(FIELDS)),
+            id=f'g-{i}',
+        )
+        for i in range(FIELDSETS)
+    ))
+
+
+def get_element_by_id_recursive(em: htmler.Element, em_id: str):
+    for child in em:
+        if isinstance(child, htmler.Element):
+            if child.id == em_id:
+                return child
+            descendant = get_element_by_id_recursive(child, em_id)
+            if descendant:
+                return descendant
+
+
+def main():
+    form = build_form()
+    ids = [f'f-{random.randrange(FIELDSETS)}-{random.randrange(FIELDS)}' for _ in range(LOOKUPS)]
+
+    for title, f in ('recursive', get_element_by_id_recursive), ('index', htmler.Element.get_element_by_id):
+        t = timeit.timeit(lambda: [f(form, em_id) for em_id in ids], number=1)
+        print(f'{title:>10}: {LOOKUPS} lookups in {t * 1000:8.2f} ms, {t / LOOKUPS * 1e6:8.2f} usec per lookup')
+
+
+if __name__ == '__main__':
+    main()
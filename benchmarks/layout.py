@@ -0,0 +1,80 @@
+"""HTMLer Block Layout Benchmark
+
+Compares indented rendering of wide tables laid out by `BlockElement._iter_layout()`, which looks whitespace between
+children up in a table by their layout kinds, with the former layout, which found it out by `isinstance()` checks of
+every child.
+
+Usage: python benchmarks/layout.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import htmler
+from htmler import BlockElement, InlineElement, NextChild, Static, Text
+
+
+def isinstance_layout(self, indent: htmler.Indent, depth: int):
+    """Former implementation of `BlockElement._iter_layout()`
+    """
+    padding = indent.padding(depth)
+    newline = indent.newline
+
+    sources = [iter(self._children)]
+    prev_child = None
+    while sources:
+        for node in sources[-1]:
+            if node.__class__ is NextChild:
+                node = yield node
+                if node is None:
+                    continue
+
+            if node._lazy:
+                sources.append(node._iter_children())
+                break
+
+            child = node.node if isinstance(node, Static) else node
+
+            if (prev_child is None or isinstance(prev_child, BlockElement)) and \
+                    isinstance(child, (Text, InlineElement)):
+                yield padding
+            if isinstance(child, BlockElement) and isinstance(prev_child, (Text, InlineElement)):
+                yield newline
+
+            yield node, depth
+            prev_child = child
+        else:
+            sources.pop()
+
+    if isinstance(prev_child, (Text, InlineElement)):
+        yield newline
+
+
+def build_table(rows: int, cols: int) -> htmler.Table:
+    return htmler.Table(htmler.Tbody(*(
+        htmler.Tr(*(htmler.Td(f'{i}:{j}') for j in range(cols)))
+        for i in range(rows)
+    )))
+
+
+def main():
+    dispatch_layout = htmler.BlockElement._iter_layout
+
+    for rows, cols in (100000, 1), (10000, 10), (1000, 100):
+        doc = build_table(rows, cols)
+        times = {}
+        for label, layout in ('isinstance', isinstance_layout), ('dispatch', dispatch_layout):
+            htmler.BlockElement._iter_layout = layout
+            try:
+                times[label] = min(timeit.repeat(doc.render, number=1, repeat=5))
+            finally:
+                htmler.BlockElement._iter_layout = dispatch_layout
+
+        print(f'{rows:>6} rows x {cols:>3} cells: isinstance {times["isinstance"] * 1000:7.1f} ms, '
+              f'dispatch {times["dispatch"] * 1000:7.1f} ms, speedup {times["isinstance"] / times["dispatch"]:.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""HTMLer Minified Rendering Benchmark
+
+Compares size of output, raw and gzipped, and render time of realistic pages rendered with indentation, without it
+and minified.
+
+Usage: python benchmarks/minify.py
+"""
+import gzip
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import htmler
+
+TEXT = '''
+    Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor incididunt ut labore et dolore
+    magna aliqua. Ut enim ad minim veniam, quis nostrud exercitation ullamco laboris nisi ut aliquip ex ea commodo.
+'''
+
+
+def build_blog() -> htmler.Html:
+    """Blog page with navigation, articles and comments
+    """
+    return htmler.Html(
+        htmler.Head(
+            htmler.Meta(charset='utf-8'),
+            htmler.Title('Blog'),
+            htmler.Link(rel='stylesheet', href='/static/main.css'),
+            htmler.Style('body {\n    margin: 0;\n}\n'),
+        ),
+        htmler.Body(
+            htmler.Nav(htmler.Ul(*(
+                htmler.Li(htmler.A(f'Section {i}', href=f'/section/{i}', css='nav-link')) for i in range(10)
+            ), css='nav')),
+            *(htmler.Article(
+                htmler.H2(htmler.A(f'Post {i}', href=f'/posts/{i}')),
+                *(htmler.P(TEXT, htmler.Em('emphasis'), TEXT) for _ in range(3)),
+                htmler.Pre(f'def post_{i}():\n    return {i}\n'),
+                htmler.Ul(*(htmler.Li(htmler.P(f'Comment {j}:'), htmler.P(TEXT)) for j in range(5)),
+                          css='comments'),
+                css='post', id=f'post-{i}',
+            ) for i in range(20)),
+        ),
+        lang='en',
+    )
+
+
+def build_report() -> htmler.Html:
+    """Page with a large table and a form
+    """
+    return htmler.Html(
+        htmler.Head(htmler.Title('Report')),
+        htmler.Body(
+            htmler.Form(
+                htmler.Select(*(htmler.Option(f'Region {i}', value=str(i)) for i in range(50)), name='region'),
+                htmler.Input(type='submit', value='Filter'),
+                action='/report', method='get',
+            ),
+            htmler.Table(
+                htmler.Thead(htmler.Tr(*(htmler.Th(f'Column {j}') for j in range(8)))),
+                htmler.Tbody(*(
+                    htmler.Tr(*(htmler.Td(f'{i * j}', css='num') for j in range(8)), css='odd' if i % 2 else 'even')
+                    for i in range(1000)
+                )),
+                css='report',
+            ),
+        ),
+        lang='en',
+    )
+
+
+def main():
+    for name, build in ('blog', build_blog), ('report', build_report):
+        doc = build()
+        print(name)
+        for label, kwargs in ('indent', {}), ('no indent', {'indent': False}), ('minify', {'minify': True}):
+            r = doc.render(**kwargs)
+            size = len(r.encode())
+            gzipped = len(gzip.compress(r.encode()))
+            t = min(timeit.repeat(lambda: doc.render(**kwargs), number=10, repeat=5)) / 10
+            print(f'    {label:>9}: {size / 1024:8.1f} KB, {gzipped / 1024:6.1f} KB gzipped, {t * 1000:7.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""HTMLer Parallel Rendering Benchmark
+
+Compares serial rendering of a report page, containing dozens of large sections, with rendering it in a process pool.
+Speedup depends on the number of CPU cores; the calling process pickles all the offloaded subtrees itself.
+
+Usage: python benchmarks/parallel.py [WORKERS]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import htmler
+
+SECTIONS = 40
+ROWS = 1000  # 5 nodes per row
+
+
+def build_section(i: int) -> htmler.Section:
+    return htmler.Section(
+        htmler.H2(f'Section {i}'),
+        htmler.P('Intro ', htmler.B('bold'), ' text'),
+        htmler.Table(htmler.Tbody(*(
+            htmler.Tr(htmler.Td(f'{i}-{j}', css='num'), htmler.Td(htmler.A('link', href=f'/{j}')))
+            for j in range(ROWS)
+        ))),
+    )
+
+
+def main():
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count()
+    doc = htmler.Html(htmler.Body(*(build_section(i) for i in range(SECTIONS))))
+
+    with htmler.ParallelRenderer(workers) as renderer:
+        renderer.render(doc)  # start the pool
+
+        for indent in True, False:
+            started = time.perf_counter()
+            expected = doc.render(indent=indent)
+            serial = time.perf_counter() - started
+
+            started = time.perf_counter()
+            assert renderer.render(doc, indent) == expected
+            parallel = time.perf_counter() - started
+
+            print(f'indent={indent!s:>5}: serial {serial:.3f}s, {workers} workers {parallel:.3f}s')
+
+
+if __name__ == '__main__':
+    main()
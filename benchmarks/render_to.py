@@ -0,0 +1,57 @@
+"""HTMLer render_to() Benchmark
+
+Compares peak RSS of rendering a 100k-node tree with `str(doc).encode()`, `render_bytes()` and `render_to()`. Every
+mode runs in a separate process, so peaks do not affect each other.
+
+Usage: python benchmarks/render_to.py
+"""
+import os
+import subprocess
+import sys
+import time
+from resource import getrusage, RUSAGE_SELF
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import htmler
+
+ROWS = 20000  # 5 nodes per row
+
+
+def build_tree() -> htmler.Table:
+    return htmler.Table(htmler.Tbody(*(
+        htmler.Tr(htmler.Td(f'Row #{i}'), htmler.Td(f'Some lengthy text of the row {i} to make the output large'))
+        for i in range(ROWS)
+    )))
+
+
+def run(mode: str):
+    doc = build_tree()
+    rss_before = getrusage(RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+
+    with open(os.devnull, 'wb') as f:
+        if mode == 'str':
+            n = f.write(str(doc).encode())
+        elif mode == 'bytes':
+            n = f.write(doc.render_bytes())
+        else:
+            n = doc.render_to(f)
+
+    elapsed = time.perf_counter() - started
+    rss_delta = getrusage(RUSAGE_SELF).ru_maxrss - rss_before
+    print(f'{mode:>10}: {n / 1024 / 1024:6.1f} MB written in {elapsed:.3f}s, '
+          f'peak RSS growth {rss_delta / 1024:6.1f} MB')
+
+
+def main():
+    if len(sys.argv) > 1:
+        run(sys.argv[1])
+        return
+
+    for mode in 'str', 'bytes', 'render_to':
+        subprocess.run([sys.executable, __file__, mode], check=True)
+
+
+if __name__ == '__main__':
+    main()
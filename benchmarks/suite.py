@@ -0,0 +1,221 @@
+"""HTMLer Benchmark Suite
+
+Measures construction and rendering of documents of several representative shapes, with and without indentation.
+For every case it reports operations per second, time per node and peak memory allocated by Python, and saves the
+results to a JSON file, which can be compared with results of another run.
+
+Usage: python benchmarks/suite.py [--repeat N] [--scale X] [--output FILE] [--compare FILE] [CASE ...]
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import htmler
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def build_wide_table(scale: float) -> htmler.Table:
+    """100k cells in rows of 10
+    """
+    return htmler.Table(htmler.Tbody(*(
+        htmler.Tr(*(htmler.Td(f'{i}:{j}') for j in range(10)))
+        for i in range(int(10000 * scale))
+    )))
+
+
+def build_deep_nesting(scale: float) -> htmler.Div:
+    """Branches of 500 nested blocks
+    """
+    root = htmler.Div()
+    for i in range(int(20 * scale)):
+        em = htmler.Span(f'leaf {i}')
+        for _ in range(500):
+            em = htmler.Div(em)
+        root.append_child(em)
+
+    return root
+
+
+def build_article(scale: float) -> htmler.Article:
+    """Paragraphs of text, which needs escaping, with some inline markup
+    """
+    text = 'Fish & chips <cost> "a lot" in the \'old\' town, ' * 8
+
+    return htmler.Article(htmler.H1('Title & subtitle'), *(
+        htmler.P(htmler.Text(text, True), htmler.B(htmler.Text(f'<{i}>', True)), htmler.Text(text, True))
+        for i in range(int(2000 * scale))
+    ))
+
+
+def build_form(scale: float) -> htmler.Form:
+    """Fields with many attributes
+    """
+    return htmler.Form(*(
+        htmler.Div(
+            htmler.Label(f'Field {i}', label_for=f'field-{i}'),
+            htmler.Input(
+                type='text', id=f'field-{i}', name=f'field_{i}', placeholder=f'Value of "field {i}"',
+                maxlength='64', required=True, css='form-control input-lg', data={'index': str(i), 'group': 'main'},
+            ),
+            css='form-group',
+        )
+        for i in range(int(5000 * scale))
+    ), action='/submit', method='post')
+
+
+CASES = {
+    'wide_table': build_wide_table,
+    'deep_nesting': build_deep_nesting,
+    'article': build_article,
+    'form': build_form,
+}
+
+
+def count_nodes(node: htmler.Node) -> int:
+    """Count nodes of a tree
+    """
+    n = 0
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        n += 1
+        stack.extend(node._children)
+
+    return n
+
+
+def measure(f, repeat: int) -> float:
+    """Get the best time of several calls of a function
+    """
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - started)
+
+    return min(times)
+
+
+def peak_memory(f) -> int:
+    """Get peak memory allocated by Python while calling a function
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        f()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_case(name: str, scale: float, repeat: int) -> dict:
+    """Run a benchmark case
+    """
+    build = CASES[name]
+    doc = build(scale)
+    nodes = count_nodes(doc)
+
+    def result(seconds: float, memory: int) -> dict:
+        return {
+            'seconds': seconds,
+            'ops_per_sec': 1 / seconds,
+            'ns_per_node': seconds / nodes * 1e9,
+            'peak_memory': memory,
+        }
+
+    r = {
+        'nodes': nodes,
+        'build': result(measure(lambda: build(scale), repeat), peak_memory(lambda: build(scale))),
+    }
+
+    for indent in True, False:
+        r['render' if indent else 'render_no_indent'] = result(
+            measure(lambda: doc.render(indent=indent), repeat),
+            peak_memory(lambda: doc.render(indent=indent)),
+        )
+
+    return r
+
+
+def git_revision() -> str:
+    """Get the current git revision, if any
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ''
+
+
+def print_results(results: dict, baseline: dict = None):
+    """Print results, comparing them with baseline ones if given
+    """
+    for name, case in results['cases'].items():
+        print(f'{name} ({case["nodes"]} nodes)')
+        for op in 'build', 'render', 'render_no_indent':
+            m = case[op]
+            line = (f'    {op:<17} {m["ops_per_sec"]:10.2f} ops/s {m["ns_per_node"]:10.1f} ns/node '
+                    f'{m["peak_memory"] / 1024 / 1024:8.1f} MB peak')
+
+            prev = (baseline or {}).get('cases', {}).get(name, {}).get(op)
+            if prev:
+                line += (f'  time {(m["seconds"] / prev["seconds"] - 1) * 100:+6.1f}%'
+                         f'  memory {(m["peak_memory"] / prev["peak_memory"] - 1) * 100:+6.1f}%')
+
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='HTMLer benchmark suite')
+    parser.add_argument('cases', nargs='*', help=f'cases to run, all by default: {", ".join(CASES)}')
+    parser.add_argument('--repeat', type=int, default=5, help='number of runs to take the best time of')
+    parser.add_argument('--scale', type=float, default=1.0, help='multiplier of documents sizes')
+    parser.add_argument('--output', help='JSON file to save results to, a new file in benchmarks/results by default')
+    parser.add_argument('--compare', help='JSON file with results to compare with')
+    args = parser.parse_args()
+
+    unknown = set(args.cases) - set(CASES)
+    if unknown:
+        parser.error(f'unknown cases: {", ".join(sorted(unknown))}')
+
+    results = {
+        'revision': git_revision(),
+        'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'speedups': htmler.escape_html is not htmler.base._escape_html_py,
+        'scale': args.scale,
+        'repeat': args.repeat,
+        'cases': {name: run_case(name, args.scale, args.repeat) for name in args.cases or CASES},
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    print_results(results, baseline)
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f'{results["date"][:19].replace(":", "")}-{results["revision"]}.json')
+
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print(f'Results saved to {output}')
+
+
+if __name__ == '__main__':
+    main()
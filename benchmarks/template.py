@@ -0,0 +1,75 @@
+"""HTMLer Template Benchmark
+
+Compares rendering segment and code templates with building and rendering the equivalent tree for every page, which
+contains a table of rows produced by a loop in the code template. Pages are rendered without indentation.
+
+Usage: python benchmarks/template.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import htmler
+
+LINKS = 20
+ROWS = 20
+PAGES = 1000
+
+
+def build_page(title, user, content) -> htmler.Html:
+    return htmler.Html(
+        htmler.Head(htmler.Title(title), htmler.Meta(charset='utf-8')),
+        htmler.Body(
+            htmler.Header(htmler.Nav(htmler.Ul(*(
+                htmler.Li(htmler.A(f'Link {i}', href=f'/link/{i}', css='nav-link'), css='nav-item')
+                for i in range(LINKS)
+            ))), htmler.Span(user, css='user')),
+            htmler.Div(htmler.H1(title), htmler.Div(content, css='content')),
+            htmler.Footer(htmler.P('Copyright'), css='footer'),
+        ),
+    )
+
+
+def build_table(rows) -> htmler.Table:
+    return htmler.Table(htmler.Tbody(rows))
+
+
+def build_row(name, qty) -> htmler.Tr:
+    return htmler.Tr(htmler.Td(name), htmler.Td(qty, css='num'))
+
+
+def main():
+    template = htmler.compile_template(build_page(
+        htmler.Placeholder('title'), htmler.Placeholder('user'), htmler.Placeholder('content'),
+    ), indent=False)
+    code_template = htmler.compile_code(build_page(
+        htmler.Placeholder('title'), htmler.Placeholder('user'),
+        build_table(htmler.Loop('rows', build_row(htmler.Placeholder('name'), htmler.Placeholder('qty')))),
+    ), indent=False)
+    values = [{
+        'title': f'Page {i}',
+        'user': f'User <{i}>',
+        'rows': [{'name': f'Item {i}-{j} & more', 'qty': str(j)} for j in range(ROWS)],
+    } for i in range(PAGES)]
+
+    def tree_page(v) -> str:
+        rows = (build_row(htmler.Text(r['name'], True), r['qty']) for r in v['rows'])
+        page = build_page(v['title'], htmler.Text(v['user'], True), build_table(htmler.LazyChildren(rows)))
+        return page.render(indent=False)
+
+    def template_page(v) -> str:
+        rows = (build_row(htmler.Text(r['name'], True), r['qty']) for r in v['rows'])
+        return template(title=v['title'], user=v['user'], content=build_table(htmler.LazyChildren(rows)))
+
+    for v in values[:10]:
+        assert code_template(**v) == template_page(v) == tree_page(v)
+
+    for title, f in ('tree', tree_page), ('template', template_page), ('code', lambda v: code_template(**v)):
+        t = timeit.timeit(lambda: [f(v) for v in values], number=1)
+        print(f'{title:>10}: {PAGES} pages in {t * 1000:8.2f} ms, {t / PAGES * 1e6:8.2f} usec per page')
+
+
+if __name__ == '__main__':
+    main()
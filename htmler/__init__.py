@@ -7,3 +7,8 @@ __license__ = 'MIT'
 from .base import *
 from .block import *
 from .inline import *
+from .template import *
+from .parallel import *
+from .profiling import *
+from .compression import *
+from .binary import *
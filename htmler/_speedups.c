@@ -0,0 +1,135 @@
+/* HTMLer Speedups
+ *
+ * Single pass implementation of htmler.base.escape_html(). The extension is optional, the pure Python
+ * implementation is used when it is not built.
+ */
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+
+/* Entities of characters to escape, indexed by character code */
+static const char *entities[128] = {
+    ['&'] = "&amp;",
+    ['<'] = "&lt;",
+    ['>'] = "&gt;",
+    ['"'] = "&quot;",
+    ['\''] = "&#x27;",
+};
+
+/* Extra length required by entities, indexed by character code */
+static const unsigned char extra_len[256] = {
+    ['&'] = 4,
+    ['<'] = 3,
+    ['>'] = 3,
+    ['"'] = 5,
+    ['\''] = 5,
+};
+
+static PyObject *
+escape_html(PyObject *self, PyObject *s)
+{
+    Py_ssize_t i, j, len, extra = 0;
+    Py_UCS4 c;
+    int kind;
+    const void *data;
+    const char *e;
+    PyObject *r;
+    void *r_data;
+    int r_kind;
+
+    if (!PyUnicode_Check(s)) {
+        PyErr_Format(PyExc_TypeError, "expected str, got %.200s", Py_TYPE(s)->tp_name);
+        return NULL;
+    }
+
+#if PY_VERSION_HEX < 0x030C0000
+    if (PyUnicode_READY(s) < 0)
+        return NULL;
+#endif
+
+    len = PyUnicode_GET_LENGTH(s);
+    kind = PyUnicode_KIND(s);
+    data = PyUnicode_DATA(s);
+
+    /* Count extra characters required by entities */
+    if (kind == PyUnicode_1BYTE_KIND) {
+        const Py_UCS1 *p = (const Py_UCS1 *)data;
+
+        /* memchr() is vectorized, so clean strings are detected much faster than by the counting loop */
+        if (memchr(p, '&', len) || memchr(p, '<', len) || memchr(p, '>', len) || memchr(p, '"', len)
+            || memchr(p, '\'', len)) {
+            for (i = 0; i < len; i++)
+                extra += extra_len[p[i]];
+        }
+    }
+    else {
+        for (i = 0; i < len; i++) {
+            c = PyUnicode_READ(kind, data, i);
+            if (c < 128)
+                extra += extra_len[c];
+        }
+    }
+
+    /* Nothing to escape */
+    if (!extra) {
+        if (PyUnicode_CheckExact(s)) {
+            Py_INCREF(s);
+            return s;
+        }
+        return PyUnicode_FromObject(s);
+    }
+
+    r = PyUnicode_New(len + extra, PyUnicode_MAX_CHAR_VALUE(s));
+    if (r == NULL)
+        return NULL;
+
+    r_kind = PyUnicode_KIND(r);
+    r_data = PyUnicode_DATA(r);
+
+    if (kind == PyUnicode_1BYTE_KIND) {
+        const Py_UCS1 *p = (const Py_UCS1 *)data;
+        Py_UCS1 *q = (Py_UCS1 *)r_data;
+
+        for (i = 0; i < len; i++) {
+            if (extra_len[p[i]]) {
+                for (e = entities[p[i]]; *e; e++)
+                    *q++ = *e;
+            }
+            else {
+                *q++ = p[i];
+            }
+        }
+    }
+    else {
+        for (i = 0, j = 0; i < len; i++) {
+            c = PyUnicode_READ(kind, data, i);
+            if (c < 128 && (e = entities[c]) != NULL) {
+                while (*e)
+                    PyUnicode_WRITE(r_kind, r_data, j++, *e++);
+            }
+            else {
+                PyUnicode_WRITE(r_kind, r_data, j++, c);
+            }
+        }
+    }
+
+    return r;
+}
+
+static PyMethodDef speedups_methods[] = {
+    {"escape_html", (PyCFunction)escape_html, METH_O, "Escape an HTML string"},
+    {NULL, NULL, 0, NULL}
+};
+
+static struct PyModuleDef speedups_module = {
+    PyModuleDef_HEAD_INIT,
+    "htmler._speedups",
+    "HTMLer Speedups",
+    -1,
+    speedups_methods
+};
+
+PyMODINIT_FUNC
+PyInit__speedups(void)
+{
+    return PyModule_Create(&speedups_module);
+}
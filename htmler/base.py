@@ -4,21 +4,69 @@ __author__ = 'Oleksandr Shepetko'
 __email__ = 'a@shepetko.com'
 __license__ = 'MIT'
 
-from typing import List, Generator, Union, Optional
+from typing import List, Generator, Iterable, Iterator, AsyncIterator, Callable, Union, Optional, Tuple
+from asyncio import sleep
+from inspect import CO_VARKEYWORDS, isawaitable, isasyncgenfunction, iscoroutinefunction
 from abc import ABC, abstractmethod
 from copy import copy
+from io import TextIOBase
+from codecs import getincrementalencoder
+from operator import attrgetter
+from threading import local
+
+CHUNK_SIZE = 8192
+ATTRS_STR_CACHE_SIZE = 4096
+
+# Kinds of nodes in block layout, see `BlockElement._iter_layout()`
+_LAYOUT_NONE = 0  # no node, before the first child and after the last one
+_LAYOUT_TEXT = 1  # text nodes and inline elements
+_LAYOUT_BLOCK = 2
+_LAYOUT_OTHER = 3
+_LAYOUT_STATIC = 4  # laid out as the wrapped node
+_LAYOUT_LAZY = 5  # replaced with nodes it produces
+_LAYOUT_NEXT = 6  # request for a child produced by `AsyncChildren`
 
 _NODE_SINGLE_ATTRS = ('allowfullscreen', 'async', 'checked', 'hidden', 'selected', 'required')
 _NODE_REPLACE_ATTRS = {
     'css': 'class',
-    'label_for': 'for',
+    'label-for': 'for',
 }
 
 
-def escape_html(s):
+def escape_html(s: str) -> str:
     """Escape an HTML string
+
+    Every character is looked for before replacing, so strings which need no escaping are returned as is without any
+    copying. This implementation is replaced with the single pass one from `htmler._speedups` if it is built.
+    """
+    if '&' in s:
+        s = s.replace('&', '&amp;')
+    if '<' in s:
+        s = s.replace('<', '&lt;')
+    if '>' in s:
+        s = s.replace('>', '&gt;')
+    if '"' in s:
+        s = s.replace('"', '&quot;')
+    if "'" in s:
+        s = s.replace("'", '&#x27;')
+
+    return s
+
+
+_escape_html_py = escape_html
+
+try:
+    from ._speedups import escape_html
+except ImportError:  # pragma: no cover
+    pass
+
+
+def html_attr_name(attr: str) -> str:
+    """Get HTML name of an attribute
     """
-    return s.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace('"', "&quot;")
+    attr = attr.strip().replace('_', '-')
+
+    return _NODE_REPLACE_ATTRS.get(attr, attr)
 
 
 def html_attrs_str(attrs: dict) -> str:
@@ -26,9 +74,7 @@ def html_attrs_str(attrs: dict) -> str:
     """
     r = ''
     for k, v in attrs.items():
-        k = k.strip().replace('_', '-')
-        if k in _NODE_REPLACE_ATTRS:
-            k = _NODE_REPLACE_ATTRS[k]
+        k = html_attr_name(k)
 
         if v is not None:
             if k in _NODE_SINGLE_ATTRS:
@@ -40,16 +86,466 @@ def html_attrs_str(attrs: dict) -> str:
     return r
 
 
+class CssClasses:
+    """Ordered Set of CSS Classes
+
+    Membership checks and changes take constant time; the classes are joined into a string only when it is requested,
+    once per change.
+    """
+
+    __slots__ = ('_classes', '_str')
+
+    def __init__(self, classes: Iterable[str] = ()):
+        """Init
+        """
+        self._classes = dict.fromkeys(c for css in classes for c in css.split())
+        self._str = None
+
+    def add(self, *classes: str):
+        """Add classes
+        """
+        for css in classes:
+            for c in css.split():
+                self._classes[c] = None
+        self._str = None
+
+    def discard(self, *classes: str):
+        """Remove classes if they are present
+        """
+        for css in classes:
+            for c in css.split():
+                self._classes.pop(c, None)
+        self._str = None
+
+    def __contains__(self, css_class: str) -> bool:
+        """__contains__()
+        """
+        return css_class in self._classes
+
+    def __iter__(self) -> Iterator[str]:
+        """__iter__()
+        """
+        return iter(self._classes)
+
+    def __len__(self) -> int:
+        """__len__()
+        """
+        return len(self._classes)
+
+    def __str__(self) -> str:
+        """__str__()
+        """
+        if self._str is None:
+            self._str = ' '.join(self._classes)
+
+        return self._str
+
+    def __reduce__(self) -> tuple:
+        """__reduce__()
+        """
+        return CssClasses, (str(self).split(),)
+
+
+_attrs_str_cache = {}
+
+
+def html_attrs_str_cached(attrs: dict) -> str:
+    """Format dictionary as an attributes string, sharing the result between equal dictionaries
+
+    Only dictionaries with string values and CSS classes are cached, since values of other types may be equal while
+    being formatted differently, like `1` and `True`.
+    """
+    if not attrs:
+        return ''
+
+    key = []
+    for k, v in attrs.items():
+        cls = v.__class__
+        if cls is CssClasses:
+            v = str(v)
+        elif cls is not str and v is not None:
+            return html_attrs_str(attrs)
+        key.append((k, v))
+
+    key = tuple(key)
+    r = _attrs_str_cache.get(key)
+    if r is None:
+        if len(_attrs_str_cache) >= ATTRS_STR_CACHE_SIZE:
+            _attrs_str_cache.clear()
+        r = _attrs_str_cache[key] = html_attrs_str(attrs)
+
+    return r
+
+
+def _indent_mode(indent):
+    """Get indentation mode from a value passed as `render(indent=...)`
+
+    An `Indent` is used as is, any other value is taken as true or false.
+    """
+    if indent is True or indent is False:
+        return indent
+
+    from .block import Indent
+    return indent if isinstance(indent, Indent) else bool(indent)
+
+
+def render_fragments(node, indent: bool = True, depth: int = 0) -> Iterator[str]:
+    """Yield rendered fragments of a tree in document order
+
+    The tree is walked with an explicit stack instead of recursion, so its depth is not limited by the interpreter's
+    recursion limit. Every node expands itself into either a string or a list of strings, `(child, depth)` pairs and
+    iterators producing more of them, see `Node._expand()`.
+    """
+    stack = [(node, depth)]
+    pop = stack.pop
+    push = stack.append
+    extend = stack.extend
+
+    while stack:
+        item = pop()
+        cls = item.__class__
+
+        if cls is tuple:
+            node, depth = item
+            item = node._expand(indent, depth)
+            if item.__class__ is list:
+                item.reverse()
+                extend(item)
+            elif item:
+                yield item
+
+        elif cls is str or isinstance(item, str):
+            if item:
+                yield item
+
+        # Iterator producing items lazily, take the next one
+        else:
+            for next_item in item:
+                push(item)
+                push(next_item)
+                break
+
+
+def render_memoized(node, indent: bool = True, depth: int = 0) -> str:
+    """Render a tree, reusing output of elements which have not changed since they were rendered last time
+
+    Rendered output of every element is stored per indentation mode and depth, and dropped when the element or any of
+    its descendants is changed. Output of elements containing lazily produced children is never stored. Like
+    `render_fragments()`, the tree is walked with an explicit stack.
+    """
+    out = []
+    stack = [(node, depth)]
+    pop = stack.pop
+    push = stack.append
+    extend = stack.extend
+
+    level = 0  # number of elements being rendered
+    volatile = 0  # number of outermost elements being rendered which contain lazily produced children
+
+    while stack:
+        item = pop()
+        cls = item.__class__
+
+        if cls is tuple:
+            if len(item) == 2:
+                node, depth = item
+                key = (indent, depth)
+                cache = node._cache
+                if cache and key in cache:
+                    out.append(cache[key])
+                    continue
+
+                item = node._expand(indent, depth)
+                if item.__class__ is list:
+                    push((node, key, out))
+                    out = []
+                    level += 1
+                    if node._lazy or any(child._lazy for child in node._children):
+                        volatile = level
+                    item.reverse()
+                    extend(item)
+                else:
+                    out.append(item)
+
+            # All fragments of the element are in the buffer, store them
+            else:
+                node, key, parent_out = item
+                r = ''.join(out)
+                if level > volatile:
+                    if node._cache is None:
+                        node._cache = {}
+                    node._cache[key] = r
+                else:
+                    volatile = level - 1
+                level -= 1
+                parent_out.append(r)
+                out = parent_out
+
+        elif cls is str or isinstance(item, str):
+            out.append(item)
+
+        # Iterator producing items lazily, take the next one
+        else:
+            for next_item in item:
+                push(item)
+                push(next_item)
+                break
+
+    return ''.join(out)
+
+
+async def render_chunks_async(node, indent: bool = True, depth: int = 0, chunk_size: int = CHUNK_SIZE) \
+        -> AsyncIterator[str]:
+    """Render a tree asynchronously, yielding chunks of at least `chunk_size` characters
+
+    Works as `render_fragments()` does, except that children produced by `AsyncChildren` are awaited, and control is
+    given back to the event loop after every chunk.
+    """
+    stack = [(node, depth)]
+    pop = stack.pop
+    push = stack.append
+    extend = stack.extend
+
+    buf = []
+    size = 0
+
+    while stack:
+        item = pop()
+        cls = item.__class__
+
+        if cls is tuple:
+            node, depth = item
+            item = node._expand(indent, depth)
+            if item.__class__ is list:
+                item.reverse()
+                extend(item)
+                continue
+
+        elif not (cls is str or isinstance(item, str)):
+            # Iterator producing items lazily, take the next one, awaiting requested children
+            for next_item in item:
+                if next_item.__class__ is NextChild:
+                    try:
+                        next_item = item.send(await next_item.next())
+                        while next_item.__class__ is NextChild:
+                            next_item = item.send(await next_item.next())
+                    except StopIteration:
+                        break
+                push(item)
+                push(next_item)
+                break
+            continue
+
+        if item:
+            buf.append(item)
+            size += len(item)
+            if size >= chunk_size:
+                yield ''.join(buf)
+                buf = []
+                size = 0
+                await sleep(0)
+
+    if buf:
+        yield ''.join(buf)
+
+
+def _is_text_writer(writer) -> bool:
+    """Check if a writer takes strings rather than bytes
+    """
+    if isinstance(writer, TextIOBase):
+        return True
+
+    mode = getattr(writer, 'mode', None)
+    if isinstance(mode, str):
+        return 'b' not in mode
+
+    return isinstance(getattr(writer, 'encoding', None), str)
+
+
+_rendering = local()  # nodes being rendered by their overridden `render()` or `_render_children()` in this thread
+
+
+def _expand_by_render(expand: Callable) -> Callable:
+    """Make an expansion method calling overridden `render()` of nodes
+
+    Overridden `render()` can call `Node.render()`, which expands the node again; that time it is expanded by
+    `expand()`.
+    """
+    def _expand(self, indent: bool, depth: int) -> Union[str, list]:
+        nodes = getattr(_rendering, 'nodes', None)
+        if nodes is None:
+            nodes = _rendering.nodes = set()
+        key = id(self)
+        if key in nodes:
+            return expand(self, indent, depth)
+
+        nodes.add(key)
+        try:
+            return self.render(indent=indent, depth=depth)
+        finally:
+            nodes.discard(key)
+
+    return _expand
+
+
+def _expand_children_by_render(expand_children: Callable) -> Callable:
+    """Make a children expansion method calling overridden `_render_children()` of elements
+
+    Overridden `_render_children()` can call `Element._render_children()`, which expands children of the element
+    again; that time they are expanded by `expand_children()`.
+    """
+    def _expand_children(self, indent: bool, depth: int) -> str:
+        elements = getattr(_rendering, 'elements', None)
+        if elements is None:
+            elements = _rendering.elements = set()
+        key = id(self)
+        if key in elements:
+            return expand_children(self, indent, depth)
+
+        elements.add(key)
+        try:
+            return self._render_children(indent=indent, depth=depth)
+        finally:
+            elements.discard(key)
+
+    return _expand_children
+
+
+def _positional_hook(f: Callable) -> Callable:
+    """Make a rendering hook taking options as keyword arguments only callable with positional ones
+    """
+    def hook(self, indent: bool = True, depth: int = 0) -> str:
+        return f(self, indent=indent, depth=depth)
+
+    return hook
+
+
+def _id_elements(value) -> tuple:
+    """Get elements indexed by an ID, which are kept in a tuple if there are several of them
+    """
+    return value if value.__class__ is tuple else (value,)
+
+
+def _merge_ids(index: dict, ids: dict):
+    """Add IDs of elements to an index
+
+    Different elements with the same ID are kept together in a tuple, so any of them can be removed from the index
+    without looking for the others.
+    """
+    if index.keys().isdisjoint(ids):
+        index.update(ids)
+        return
+
+    for em_id, em in ids.items():
+        other = index.get(em_id)
+        if other is None or other is em:
+            index[em_id] = em
+        else:
+            ems = _id_elements(other)
+            ems += tuple(e for e in _id_elements(em) if all(e is not o for o in ems))
+            index[em_id] = ems[0] if len(ems) == 1 else ems
+
+
 class Node(ABC):
     """Base node
     """
 
+    __slots__ = ('_parent',)
+
+    _name = 'node'
+    _children = ()  # type: List[Node]
+    _cache = None  # type: Optional[dict]  # data derived from the subtree, like rendered output; dropped on change
+    _lazy = False
+    _layout = _LAYOUT_OTHER  # kind of nodes in block layout
+
+    def __init_subclass__(cls, **kwargs):
+        """Set up a subclass
+        """
+        super().__init_subclass__(**kwargs)
+
+        cls._name = cls.__name__.lower()
+
+        if cls._lazy:
+            cls._layout = _LAYOUT_LAZY
+
+        # Subclasses written for the former recursive renderer override `render()`, which renderers do not call for
+        # nested nodes, so such nodes are expanded by calling it
+        if 'render' in cls.__dict__:
+            cls._expand = _expand_by_render(cls._expand)
+
+        # ...or `_render_children()`, which is not a rendering hook anymore...
+        if '_render_children' in cls.__dict__ and '_expand_children' not in cls.__dict__:
+            cls._expand_children = _expand_children_by_render(cls._expand_children)
+
+        # ...and take rendering options of their hooks as keyword arguments only
+        for hook in '_render_open_tag', '_render_close_tag':
+            f = cls.__dict__.get(hook)
+            code = getattr(f, '__code__', None)
+            if code is not None and code.co_argcount == 1 and code.co_flags & CO_VARKEYWORDS:
+                setattr(cls, hook, _positional_hook(f))
+
+        # Parent and cached data are not pickled, so a subtree is pickled without the rest of the tree
+        slots = [slot for c in reversed(cls.__mro__) for slot in c.__dict__.get('__slots__', ())]
+        cls._pickled_slots = tuple(slot for slot in slots if slot not in ('_parent', '_cache'))
+        cls._get_state = attrgetter(*cls._pickled_slots) if cls._pickled_slots else None
+        cls._cache_slot = '_cache' in slots
+        cls._dict_state = cls.__dictoffset__ != 0
+
     @property
     def name(self):
         """Get node's name
         """
         return self._name
 
+    def __getstate__(self):
+        """Get node's state for pickling
+
+        Values of slots are got at once by an `attrgetter`, which makes pickling large trees about twice as fast.
+        """
+        state = self._get_state(self) if self._get_state else None
+
+        return (state, self.__dict__) if self._dict_state else state
+
+    def __setstate__(self, state):
+        """Restore node's state after unpickling
+
+        Unpickled node has no parent.
+        """
+        self._parent = None
+        if self._cache_slot:
+            self._cache = None
+
+        if self._dict_state:
+            state, attrs = state
+            self.__dict__.update(attrs)
+
+        slots = self._pickled_slots
+        if len(slots) == 1:
+            setattr(self, slots[0], state)
+        else:
+            for slot, value in zip(slots, state):
+                setattr(self, slot, value)
+
+    def __copy__(self):
+        """Make a shallow copy of the node
+
+        The copy shares children with the node, which keep their parent; it has no parent and no cached data.
+        """
+        node = object.__new__(self.__class__)
+        Node.__setstate__(node, self.__getstate__())
+
+        return node
+
+    @property
+    def parent(self):
+        """Get node's parent
+
+        A node appended to several parents refers to the last one.
+
+        :rtype: Optional[Node]
+        """
+        return self._parent
+
     @property
     def children(self):
         """Get node's children
@@ -61,8 +557,7 @@ class Node(ABC):
     def __init__(self, *args):
         """Init
         """
-        self._name = self.__class__.__name__.lower()
-        self._children = []  # type: List[Node]
+        self._parent = None  # type: Optional[Node]
 
         for child in args:
             self.append_child(child)
@@ -76,10 +571,47 @@ class Node(ABC):
         if not isinstance(child, Node):
             raise TypeError(f'{type(child)} cannot be child of {type(self)}')
 
+        child._parent = self
         self._children.append(child)
+        self._invalidate()
 
         return child
 
+    def remove_child(self, child):
+        """Remove a child node
+
+        :type child: Node
+        :rtype Node
+        """
+        for i, c in enumerate(self._children):
+            if c is child:
+                del self._children[i]
+                break
+        else:
+            raise ValueError(f'{type(child)} is not a child of {type(self)}')
+
+        if child._parent is self:
+            child._parent = None
+        self._invalidate()
+
+        return child
+
+    def _invalidate(self):
+        """Forget cached data of the node and all of its ancestors
+        """
+        node = self
+        while node is not None:
+            if node._cache is not None:
+                node._cache = None
+            node = node._parent
+
+    def freeze(self):
+        """Freeze the node into a prerendered fragment
+
+        :rtype: Static
+        """
+        return Static(self)
+
     def wrap(self, wrapper):
         """Wrap the node with another one
 
@@ -90,10 +622,149 @@ class Node(ABC):
         return wrapper
 
     @abstractmethod
+    def _expand(self, indent: bool, depth: int) -> Union[str, list]:
+        """Expand the node for rendering
+
+        Returns either the rendered node or a list of rendered fragments and `(child, depth)` pairs in document order.
+        """
+        pass  # pragma: no cover
+
+    def _iter_render(self, **kwargs) -> Iterator[str]:
+        """Yield rendered fragments of the node in document order
+        """
+        indent = _indent_mode(kwargs.get('indent', True))
+        depth = kwargs.get('depth', 0)
+        parallel = kwargs.get('parallel')
+        profile = kwargs.get('profile')
+
+        if parallel and kwargs.get('memoize'):
+            raise ValueError('memoized rendering cannot be parallel')
+
+        if kwargs.get('minify'):
+            if parallel or kwargs.get('memoize') or profile is not None:
+                raise ValueError('minified rendering cannot be memoized, parallel or profiled')
+            from .minify import minify_fragments
+            return minify_fragments(self)
+
+        if profile is not None:
+            if parallel or kwargs.get('memoize'):
+                raise ValueError('profiled rendering cannot be memoized or parallel')
+            from .profiling import profile_fragments
+            return profile_fragments(self, indent, depth, profile)
+
+        if kwargs.get('memoize'):
+            return iter((render_memoized(self, indent, depth),))
+
+        if parallel:
+            from .parallel import ParallelRenderer
+            if isinstance(parallel, ParallelRenderer):
+                return iter((parallel.render(self, indent, depth),))
+            with ParallelRenderer(parallel) as renderer:
+                return iter((renderer.render(self, indent, depth),))
+
+        return render_fragments(self, indent, depth)
+
+    def iter_render(self, chunk_size: int = CHUNK_SIZE, **kwargs) -> Iterator[str]:
+        """Render the node, yielding chunks of at least `chunk_size` characters
+
+        The last chunk may be shorter.
+        """
+        buf = []
+        size = 0
+        for s in self._iter_render(**kwargs):
+            buf.append(s)
+            size += len(s)
+            if size >= chunk_size:
+                yield ''.join(buf)
+                buf = []
+                size = 0
+
+        if buf:
+            yield ''.join(buf)
+
     def render(self, **kwargs) -> str:
         """Render the node
         """
-        pass  # pragma: no cover
+        return ''.join(self._iter_render(**kwargs))
+
+    async def aiter_render(self, chunk_size: int = CHUNK_SIZE, **kwargs) -> AsyncIterator[str]:
+        """Render the node asynchronously, yielding chunks of at least `chunk_size` characters
+
+        Control is given back to the event loop after every chunk and while children produced by `AsyncChildren` are
+        awaited, so rendering a large document does not block other tasks for long. The last chunk may be shorter.
+        """
+        if kwargs.get('memoize') or kwargs.get('parallel') or kwargs.get('profile') is not None or kwargs.get('minify'):
+            raise ValueError('asynchronous rendering cannot be memoized, parallel, profiled or minified')
+
+        indent = _indent_mode(kwargs.get('indent', True))
+        async for chunk in render_chunks_async(self, indent, kwargs.get('depth', 0), chunk_size):
+            yield chunk
+
+    async def arender(self, **kwargs) -> str:
+        """Render the node asynchronously
+        """
+        return ''.join([chunk async for chunk in self.aiter_render(**kwargs)])
+
+    def render_bytes(self, encoding: str = 'utf-8', chunk_size: int = CHUNK_SIZE, **kwargs) -> bytearray:
+        """Render the node into a buffer of bytes encoded with `encoding`
+
+        Output is encoded in chunks of about `chunk_size` characters, so unlike with `render().encode()`, neither the
+        whole document as a string nor the list of its fragments is held in memory. The buffer can be handed to
+        `socket.sendall()` or wrapped in a `memoryview` without copying.
+        """
+        r = bytearray()
+        encode = getincrementalencoder(encoding)().encode
+        for chunk in self.iter_render(chunk_size, **kwargs):
+            r += encode(chunk)
+
+        return r
+
+    def iter_compressed(self, codec: str = 'gzip', level: Optional[int] = None, encoding: str = 'utf-8',
+                        chunk_size: int = CHUNK_SIZE, flush: bool = False, **kwargs) -> Iterator[bytes]:
+        """Render the node, yielding output encoded with `encoding` and compressed with `codec`
+
+        Chunks of about `chunk_size` characters are compressed as they are rendered, so the uncompressed document is
+        never held in memory. With `flush`, compressed data of every chunk is flushed, so a client can start
+        decompressing it before the whole document is rendered; only 'gzip', 'zlib' and 'deflate' codecs support that.
+        """
+        from .compression import compress_chunks
+        return compress_chunks(self.iter_render(chunk_size, **kwargs), codec, level, encoding, flush)
+
+    def render_compressed(self, codec: str = 'gzip', level: Optional[int] = None, encoding: str = 'utf-8',
+                          chunk_size: int = CHUNK_SIZE, **kwargs) -> bytes:
+        """Render the node into bytes encoded with `encoding` and compressed with `codec`
+        """
+        return b''.join(self.iter_compressed(codec, level, encoding, chunk_size, **kwargs))
+
+    def render_to(self, writer, encoding: str = 'utf-8', buffer_size: int = CHUNK_SIZE, binary: Optional[bool] = None,
+                  **kwargs) -> int:
+        """Render the node into an object with a `write()` method
+
+        Text writers get strings, binary ones (binary file, `io.BytesIO`, `socket.makefile('wb')`, etc.) get bytes
+        encoded with `encoding`. Unless `binary` is given, a writer is taken for a text one if it is a text stream, or
+        if it has a `mode` without 'b' or, lacking a mode, an `encoding`. Output is buffered in chunks of about
+        `buffer_size` characters, so the whole document is never held in memory at once.
+
+        :return: number of characters or bytes written
+        """
+        write = writer.write
+        n = 0
+
+        if binary is None:
+            binary = not _is_text_writer(writer)
+
+        if not binary:
+            for chunk in self.iter_render(buffer_size, **kwargs):
+                write(chunk)
+                n += len(chunk)
+        else:
+            encode = getincrementalencoder(encoding)().encode
+            for chunk in self.iter_render(buffer_size, **kwargs):
+                chunk = encode(chunk)
+                write(chunk)
+                n += len(chunk)
+
+        return n
 
     def __str__(self) -> str:
         """___str___()
@@ -120,6 +791,23 @@ class Text(Node):
     """Text Node
     """
 
+    __slots__ = ('_content',)
+
+    _layout = _LAYOUT_TEXT
+
+    @property
+    def content(self) -> str:
+        """Get node's content
+        """
+        return self._content
+
+    @content.setter
+    def content(self, content: str):
+        """Set node's content
+        """
+        self._content = content if isinstance(content, str) else str(content)
+        self._invalidate()
+
     def __init__(self, content: str = '', escape: bool = False):
         """Init
         """
@@ -135,8 +823,8 @@ class Text(Node):
         """
         raise ValueError(f"'{self._name}' element cannot contain children")
 
-    def render(self, **kwargs) -> str:
-        """Render the node
+    def _expand(self, indent: bool, depth: int) -> str:
+        """Expand the node for rendering
         """
         return self._content
 
@@ -145,16 +833,293 @@ class Comment(Text):
     """Comment Node
     """
 
-    def render(self, **kwargs) -> str:
-        """Render the node
+    __slots__ = ()
+
+    def _expand(self, indent: bool, depth: int) -> str:
+        """Expand the node for rendering
         """
         return f'<!-- {self._content} -->'
 
 
+class Static(Node):
+    """Prerendered Fragment
+
+    Renders the wrapped node once per indentation mode and depth and reuses the result afterwards. The wrapped node
+    is laid out by block elements the same way as if it was not frozen. Since the rendered output is reused, the
+    wrapped node must not be changed after freezing, or `invalidate()` must be called after a change.
+    """
+
+    __slots__ = ('_node', '_cache')
+
+    _layout = _LAYOUT_STATIC
+
+    @property
+    def node(self) -> Node:
+        """Get the wrapped node
+        """
+        return self._node
+
+    def __init__(self, node: Node):
+        """Init
+        """
+        super().__init__()
+
+        if not isinstance(node, Node):
+            raise TypeError(f'{type(node)} cannot be frozen')
+
+        self._node = node.node if isinstance(node, Static) else node
+        self._cache = None
+
+    def append_child(self, child: Node):
+        """Append a child node
+        """
+        raise ValueError(f"'{self._name}' node cannot contain children")
+
+    def freeze(self):
+        """Freeze the node into a prerendered fragment
+        """
+        return self
+
+    def invalidate(self):
+        """Forget previously rendered output
+        """
+        self._invalidate()
+
+        return self
+
+    def _expand(self, indent: bool, depth: int) -> str:
+        """Expand the node for rendering
+        """
+        if self._cache is None:
+            self._cache = {}
+
+        key = (indent, depth)
+        r = self._cache.get(key)
+        if r is None:
+            r = self._cache[key] = ''.join(render_fragments(self._node, indent, depth))
+
+        return r
+
+
+class LazyChildren(Node):
+    """Lazily Produced Child Nodes
+
+    Wraps an iterable of nodes and strings, or a callable returning one, which is consumed only while rendering.
+    Produced nodes are laid out as if they were children of the parent element, and are not attached to it, so each of
+    them can be freed as soon as it is rendered. A callable is called on every rendering, while an iterator can be
+    consumed only once and produces nothing the next time the parent is rendered.
+    """
+
+    __slots__ = ('_source',)
+
+    _lazy = True
+
+    @property
+    def source(self) -> Union[Iterable[Union[Node, str]], Callable[[], Iterable[Union[Node, str]]]]:
+        """Get the source of child nodes
+        """
+        return self._source
+
+    def __init__(self, source: Union[Iterable[Union[Node, str]], Callable[[], Iterable[Union[Node, str]]]]):
+        """Init
+        """
+        super().__init__()
+
+        self._source = source
+
+    def append_child(self, child: Node):
+        """Append a child node
+        """
+        raise ValueError(f"'{self._name}' node cannot contain children")
+
+    def _iter_children(self) -> Iterator[Node]:
+        """Produce child nodes
+        """
+        source = self._source
+        if callable(source):
+            source = source()
+            if isinstance(source, (Node, str)):
+                source = (source,)
+
+        for child in source:
+            if isinstance(child, str):
+                child = Text(child)
+            elif not isinstance(child, Node):
+                raise TypeError(f'{type(child)} cannot be child of {type(self._parent)}')
+
+            if child._lazy:
+                yield from child._iter_children()
+            else:
+                yield child
+
+    def _expand(self, indent: bool, depth: int) -> list:
+        """Expand the node for rendering
+        """
+        return [self._iter_expand(depth)]
+
+    def _iter_expand(self, depth: int) -> Generator:
+        """Produce child nodes, passing requests for children produced by `AsyncChildren` through to the renderer
+        """
+        for child in self._iter_children():
+            if child.__class__ is NextChild:
+                child = yield child
+                if child is None:
+                    continue
+            yield child, depth
+
+
+def is_async_source(obj) -> bool:
+    """Check if an object is a source of children which must be awaited
+    """
+    return hasattr(obj, '__aiter__') or isawaitable(obj) or iscoroutinefunction(obj) or isasyncgenfunction(obj)
+
+
+class _Expansion:
+    """Fragments and child nodes a node is expanded into, rendered on their own
+    """
+
+    __slots__ = ('_items',)
+
+    def __init__(self, items: Union[list, Iterator]):
+        """Init
+        """
+        self._items = items if items.__class__ is list else [items]
+
+    def _expand(self, indent: bool, depth: int) -> list:
+        """Expand for rendering
+        """
+        return self._items
+
+
+class NextChild:
+    """Request for the next child produced by `AsyncChildren`
+
+    Renderers yield requests instead of children which are not produced yet; `render_chunks_async()` awaits the child
+    and sends it back, or sends `None` if there are no more children.
+    """
+
+    __slots__ = ('_children', 'done')
+
+    _layout = _LAYOUT_NEXT
+
+    def __init__(self, node):
+        """Init
+        """
+        self._children = node._aiter_children()
+        self.done = False
+
+    def __iter__(self):
+        """__iter__()
+        """
+        raise TypeError('async children can be rendered only by arender() and aiter_render()')
+
+    async def next(self) -> Optional[Node]:
+        """Get the next child
+        """
+        try:
+            return await self._children.__anext__()
+        except StopAsyncIteration:
+            self.done = True
+            return None
+
+
+class AsyncChildren(Node):
+    """Asynchronously Produced Child Nodes
+
+    Wraps an async iterable of nodes and strings, an awaitable resulting in an iterable of them or a single one, or a
+    callable returning any of these, like an async generator function. Like with `LazyChildren`, produced nodes are
+    laid out as children of the parent element and are not attached to it. The parent can be rendered only by
+    `arender()` and `aiter_render()`.
+    """
+
+    __slots__ = ('_source',)
+
+    _lazy = True
+
+    @property
+    def source(self):
+        """Get the source of child nodes
+        """
+        return self._source
+
+    def __init__(self, source):
+        """Init
+        """
+        super().__init__()
+
+        self._source = source
+
+    def append_child(self, child: Node):
+        """Append a child node
+        """
+        raise ValueError(f"'{self._name}' node cannot contain children")
+
+    async def _aiter_children(self) -> AsyncIterator[Node]:
+        """Produce child nodes
+        """
+        source = self._source
+        if callable(source):
+            source = source()
+        elif isawaitable(source):
+            # Awaitable can be awaited only once, like an iterator it produces nothing the next time
+            self._source = ()
+        if isawaitable(source):
+            source = await source
+        if isinstance(source, (Node, str)):
+            source = (source,)
+
+        if hasattr(source, '__aiter__'):
+            children = source
+        else:
+            async def children():
+                for c in source:
+                    yield c
+            children = children()
+
+        async for child in children:
+            if isinstance(child, str):
+                child = Text(child)
+            elif not isinstance(child, Node):
+                raise TypeError(f'{type(child)} cannot be child of {type(self._parent)}')
+
+            if isinstance(child, AsyncChildren):
+                async for c in child._aiter_children():
+                    yield c
+            elif child._lazy:
+                for c in child._iter_children():
+                    yield c
+            else:
+                yield child
+
+    def _iter_children(self) -> Iterator[NextChild]:
+        """Produce requests for child nodes
+        """
+        request = NextChild(self)
+        while not request.done:
+            yield request
+
+    def _expand(self, indent: bool, depth: int) -> list:
+        """Expand the node for rendering
+        """
+        return [self._iter_expand(depth)]
+
+    def _iter_expand(self, depth: int) -> Generator:
+        """Produce child nodes, requesting each of them first
+        """
+        request = NextChild(self)
+        while True:
+            child = yield request
+            if child is None:
+                return
+            yield child, depth
+
+
 class Element(Node):
     """Base HTML element
     """
 
+    __slots__ = ('_children', '_cache', '_attrs', '_attrs_str', '_ids')
+
     @property
     def id(self) -> Optional[str]:
         """Get element's ID
@@ -165,15 +1130,32 @@ class Element(Node):
     def attrs(self) -> dict:
         """Get node's attributes/values
         """
-        return copy(self._attrs)
+        if not self._attrs:
+            return {}
+
+        r = copy(self._attrs)
+        if r.get('css').__class__ is CssClasses:
+            r['css'] = str(r['css'])
+
+        return r
 
     def __init__(self, *args, **kwargs):
         """Init
         """
-        super().__init__(*args)
+        # Dictionaries are allocated on demand, most elements have neither attributes nor descendants with IDs
+        self._children = []  # type: List[Node]
+        self._cache = None
+        self._attrs = None  # type: Optional[dict]
+        self._attrs_str = ''
+        self._ids = None  # type: Optional[dict]
 
-        self._attrs = {}
-        self._children_by_id = {}
+        super().__init__()
+
+        for child in args:
+            if isinstance(child, Iterator):
+                self.extend(child)
+            else:
+                self.append_child(child)
 
         if 'data' in kwargs and isinstance(kwargs['data'], dict):
             for k, v in kwargs['data'].items():
@@ -183,28 +1165,128 @@ class Element(Node):
         for k, v in kwargs.items():
             self.set_attr(k, v)
 
+    def __setstate__(self, state: tuple):
+        """Restore element's state after unpickling
+        """
+        super().__setstate__(state)
+
+        for child in self._children:
+            child._parent = self
+
     def set_attr(self, attr: str, value: str):
         """Set attribute
+
+        CSS classes can be given either as a whitespace separated string or as an iterable of strings.
         """
-        self._attrs[attr.replace('_', '-')] = value
+        if self._attrs is None:
+            self._attrs = {}
+
+        attr = attr.replace('_', '-')
+
+        if attr == 'css' and value is not None:
+            if isinstance(value, (CssClasses, list, tuple, set, frozenset)):
+                value = CssClasses(value)
+            else:
+                value = CssClasses(str(value).split())
+
+        prev_id = self._attrs.get('id') if attr == 'id' else None
+
+        self._attrs[attr] = value
+        self._attrs_str = None
+
+        if attr == 'id' and self._parent is not None:
+            if prev_id:
+                self._parent._unindex_ids({prev_id: self})
+            if value:
+                self._parent._index_ids({value: self})
+
+        self._invalidate()
 
         return self
 
     def get_attr(self, attr, default=None) -> str:
         """Get attribute's value
         """
-        return self._attrs[attr] if attr in self._attrs else default
+        attrs = self._attrs
+        if not attrs or attr not in attrs:
+            return default
 
-    def append_child(self, child: Union[Node, str]) -> Node:
+        v = attrs[attr]
+
+        return str(v) if v.__class__ is CssClasses else v
+
+    def append_child(self, child: Union[Node, str, Callable]) -> Node:
         """Append a child node
+
+        Callables are wrapped with `LazyChildren`, async iterables, awaitables and async functions with `AsyncChildren`.
         """
         if isinstance(child, str):
             child = Text(child)
+        elif not isinstance(child, Node):
+            if is_async_source(child):
+                child = AsyncChildren(child)
+            elif callable(child):
+                child = LazyChildren(child)
 
-        if isinstance(child, Element) and child.id:
-            self._children_by_id[child.id] = child
+        super().append_child(child)
 
-        return super().append_child(child)
+        if isinstance(child, Element):
+            ids = child._subtree_ids()
+            if ids:
+                self._index_ids(ids)
+
+        return child
+
+    def remove_child(self, child: Node) -> Node:
+        """Remove a child node
+        """
+        super().remove_child(child)
+
+        if isinstance(child, Element):
+            ids = child._subtree_ids()
+            if ids:
+                self._unindex_ids(ids)
+
+        return child
+
+    def extend(self, children: Iterable[Union[Node, str]], lazy: bool = False):
+        """Append child nodes
+
+        Children are validated and appended in a single pass; if any of them is invalid, none is appended. With `lazy`
+        set, `children` is not consumed until the element is rendered, see `LazyChildren`.
+        """
+        if lazy:
+            self.append_child(LazyChildren(children))
+            return self
+
+        new_children = []
+        append = new_children.append
+        ids = {}
+
+        for child in children:
+            if isinstance(child, str):
+                child = Text(child)
+            elif not isinstance(child, Node):
+                if is_async_source(child):
+                    child = AsyncChildren(child)
+                elif callable(child):
+                    child = LazyChildren(child)
+                else:
+                    raise TypeError(f'{type(child)} cannot be child of {type(self)}')
+            elif isinstance(child, Element) and (child._ids or child._attrs):
+                _merge_ids(ids, child._subtree_ids())
+            append(child)
+
+        for child in new_children:
+            child._parent = self
+        self._children += new_children
+
+        if ids:
+            self._index_ids(ids)
+
+        self._invalidate()
+
+        return self
 
     def append_text(self, text: str) -> Text:
         """Append a text node
@@ -219,60 +1301,170 @@ class Element(Node):
     def get_element_by_id(self, em_id: str):
         """Get descendant element
 
+        Every element keeps an index of all its descendants having IDs, so the lookup does not walk the tree. If
+        several descendants have the same ID, any of them is returned. The index is kept up to date through the last
+        parent of every node only, so IDs changed in a node appended to several parents are not seen by other ones.
+
         :rtype: Optional[Element]
         """
-        if em_id in self._children_by_id:
-            return self._children_by_id[em_id]
+        em = self._ids.get(em_id) if self._ids else None
 
-        for child in self:
-            if not isinstance(child, Element):
-                continue
+        return em[0] if em.__class__ is tuple else em
+
+    def _subtree_ids(self) -> dict:
+        """Get IDs of the element and all its descendants
+        """
+        ids = dict(self._ids) if self._ids else {}
+
+        em_id = self.get_attr('id')
+        if em_id:
+            _merge_ids(ids, {em_id: self})
 
-            descendant = child.get_element_by_id(em_id)
-            if descendant:
-                return descendant
+        return ids
+
+    def _index_ids(self, ids: dict):
+        """Add descendants' IDs to the index of the element and all its ancestors
+        """
+        node = self
+        while node is not None:
+            if node._ids is None:
+                node._ids = {}
+            _merge_ids(node._ids, ids)
+            node = node._parent
+
+    def _unindex_ids(self, ids: dict):
+        """Remove descendants' IDs from the index of the element and all its ancestors
+
+        Other descendants with a removed ID are left in the index.
+        """
+        node = self
+        while node is not None:
+            index = node._ids
+            if index:
+                for em_id, em in ids.items():
+                    other = index.get(em_id)
+                    if other is em:
+                        del index[em_id]
+                    elif other.__class__ is tuple or (other is not None and em.__class__ is tuple):
+                        removed = _id_elements(em)
+                        ems = tuple(e for e in _id_elements(other) if all(e is not r for r in removed))
+                        if not ems:
+                            del index[em_id]
+                        else:
+                            index[em_id] = ems[0] if len(ems) == 1 else ems
+            node = node._parent
+
+    def select(self, selector: str) -> list:
+        """Get descendant elements matching a CSS selector, in document order
+
+        Descendants are indexed by tag names and CSS classes on the first query, and the index is reused until the
+        subtree changes. See `htmler.select` for supported selectors.
+
+        :rtype: List[Element]
+        """
+        from .select import select
+
+        return select(self, selector)
+
+    def select_one(self, selector: str):
+        """Get the first descendant element matching a CSS selector
+
+        :rtype: Optional[Element]
+        """
+        from .select import select
+
+        r = select(self, selector, 1)
+
+        return r[0] if r else None
+
+    @property
+    def css_classes(self) -> Tuple[str, ...]:
+        """Get element's CSS classes
+
+        Classes are returned in the order they were added; use `add_css()` and `remove_css()` to change them.
+        """
+        css = self._attrs.get('css') if self._attrs else None
+
+        return tuple(css) if css.__class__ is CssClasses else ()
 
     def has_css(self, css_class: str) -> bool:
         """Check if the element has a CSS class
         """
-        return css_class in self.get_attr('css', '')
+        css = self._attrs.get('css') if self._attrs else None
+
+        return css.__class__ is CssClasses and css_class in css
 
-    def add_css(self, css_class: str):
-        """Add a CSS class to the element
+    def add_css(self, *css_classes: str):
+        """Add CSS classes to the element
         """
-        return self.set_attr('css', (self.get_attr('css', '') + ' ' + css_class).strip())
+        css = self._attrs.get('css') if self._attrs else None
+        if css.__class__ is not CssClasses:
+            return self.set_attr('css', css_classes)
+
+        css.add(*css_classes)
+        self._attrs_str = None
+        self._invalidate()
 
-    def remove_css(self, css_class: str):
-        """Remove a CSS class from the element
+        return self
+
+    def remove_css(self, *css_classes: str):
+        """Remove CSS classes from the element
         """
-        return self.set_attr('css', (self.get_attr('css', '').replace(css_class, '')).strip())
+        css = self._attrs.get('css') if self._attrs else None
+        if css.__class__ is CssClasses:
+            css.discard(*css_classes)
+            self._attrs_str = None
+            self._invalidate()
+
+        return self
 
     def toggle_css(self, css_class: str):
         """Toggle a CSS class of the element
         """
         return self.remove_css(css_class) if self.has_css(css_class) else self.add_css(css_class)
 
-    def _render_open_tag(self, **kwargs) -> str:
+    def _render_open_tag(self, indent: bool = True, depth: int = 0) -> str:
         """Render opening tag
         """
-        return f'<{self._name}{html_attrs_str(self._attrs)}>'
+        attrs_str = self._attrs_str
+        if attrs_str is None:
+            attrs_str = self._attrs_str = html_attrs_str_cached(self._attrs)
+
+        return f'<{self._name}{attrs_str}>'
+
+    def _expand_children(self, indent: bool, depth: int) -> list:
+        """Expand child nodes for rendering
+        """
+        return [(child, depth) for child in self._children]
 
     def _render_children(self, **kwargs) -> str:
         """Render child nodes
+
+        Not used by renderers, kept for subclasses written for the former recursive renderer, see
+        `Node.__init_subclass__()`.
         """
-        return ''.join(child.render(**kwargs) for child in self)
+        indent = _indent_mode(kwargs.get('indent', True))
+        depth = kwargs.get('depth', 0)
 
-    def _render_close_tag(self, **kwargs) -> str:
+        return ''.join(render_fragments(_Expansion(self._expand_children(indent, depth)), indent, depth))
+
+    def _render_close_tag(self, indent: bool = True, depth: int = 0) -> str:
         """Render closing tag
         """
         return f'</{self._name}>'
 
-    def render(self, **kwargs) -> str:
-        """Render the node
+    def _expand(self, indent: bool, depth: int) -> list:
+        """Expand the element for rendering
         """
-        r = self._render_open_tag(**kwargs)
-        r += self._render_children(**kwargs)
-        r += self._render_close_tag(**kwargs)
+        r = [self._render_open_tag(indent, depth)]
+
+        children = self._expand_children(indent, depth)
+        if children.__class__ is list:
+            r += children
+        else:
+            r.append(children)
+
+        r.append(self._render_close_tag(indent, depth))
 
         return r
 
@@ -281,27 +1473,36 @@ class SingleTagElement(Element):
     """Element without closing tag
     """
 
+    __slots__ = ()
+
     def append_child(self, child: Node):
         """Append a child node
         """
         raise ValueError(f"'{self._name}' element cannot contain children")
 
-    def render(self, **kwargs) -> str:
-        """Render the element
+    def extend(self, children: Iterable[Union[Node, str]], lazy: bool = False):
+        """Append child nodes
         """
-        return self._render_open_tag(**kwargs)
+        raise ValueError(f"'{self._name}' element cannot contain children")
+
+    def _expand(self, indent: bool, depth: int) -> str:
+        """Expand the element for rendering
+        """
+        return self._render_open_tag(indent, depth)
 
 
 class TagLessElement(Element):
     """Element With No Tags
     """
 
-    def _render_open_tag(self, **kwargs) -> str:
+    __slots__ = ()
+
+    def _render_open_tag(self, indent: bool = True, depth: int = 0) -> str:
         """Render opening tag
         """
         return ''
 
-    def _render_close_tag(self, **kwargs) -> str:
+    def _render_close_tag(self, indent: bool = True, depth: int = 0) -> str:
         """Render closing tag
         """
         return ''
@@ -0,0 +1,438 @@
+"""HTMLer Binary Serialization
+"""
+__author__ = 'Oleksandr Shepetko'
+__email__ = 'a@shepetko.com'
+__license__ = 'MIT'
+
+import gc
+import mmap
+import re
+from itertools import accumulate, islice
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, Tuple, Union
+from . import base, block, inline
+from .base import Node, Text, Static, Element, CssClasses
+
+MAGIC = b'HTMLER'
+FORMAT_VERSION = 1
+
+_HEADER_SIZE = len(MAGIC) + 5  # magic, version and size of the integers section
+
+# Kinds of serialized nodes
+_TEXT = 0
+_ELEMENT = 1
+_STATIC = 2
+
+# Types of attributes' values, stored in the lowest bits of their codes
+_VALUE_STR = 0
+_VALUE_BOOL = 1
+_VALUE_NONE = 2
+_VALUE_CSS = 3
+_VALUE_INT = 4
+_VALUE_FLOAT = 5
+_VALUE_BITS = 3
+_VALUE_MASK = (1 << _VALUE_BITS) - 1
+
+_HIGH_BYTES = bytes(range(0x80, 0x100))
+_MULTIBYTE_RE = re.compile(rb'[\x80-\xff]+[\x00-\x7f]')  # integers encoded with several bytes
+_VALUE_CLASSES = frozenset((str, bool, int, float, type(None)))
+
+_registry = {}  # type: Dict[str, Tuple[type, int]]
+_names = {}  # type: Dict[type, str]
+
+
+def register_node_class(cls: type):
+    """Register a node class, so its nodes can be serialized
+
+    Classes are identified by their module and qualified names, which must be the same in the process loading the
+    data. Text, comment, frozen nodes and elements defined by HTMLer are registered already; registered subclasses
+    must not add slots to their bases, and their nodes must not have instance attributes.
+    """
+    for kind, kind_base in (_TEXT, Text), (_STATIC, Static), (_ELEMENT, Element):
+        if isinstance(cls, type) and issubclass(cls, kind_base):
+            break
+    else:
+        raise TypeError(f'{cls} is not a text, frozen node or element class')
+
+    if cls._lazy or cls._pickled_slots != kind_base._pickled_slots:
+        raise TypeError(f'{cls} has state which cannot be serialized')
+
+    name = f'{cls.__module__}.{cls.__qualname__}'
+    _registry[name] = (cls, kind)
+    _names[cls] = name
+
+
+def _register_module(module):
+    """Register node classes defined in a module
+    """
+    for obj in vars(module).values():
+        if isinstance(obj, type) and obj.__module__ == module.__name__ and issubclass(obj, (Text, Static, Element)):
+            register_node_class(obj)
+
+
+for _module in base, block, inline:
+    _register_module(_module)
+
+
+def _encode_varints(ints: Iterable[int]) -> bytearray:
+    """Encode non-negative integers with 7 bits per byte, the highest bit marking bytes which are followed by more
+    """
+    r = bytearray()
+    append = r.append
+
+    for v in ints:
+        while v > 0x7f:
+            append(v & 0x7f | 0x80)
+            v >>= 7
+        append(v)
+
+    return r
+
+
+def _decode_varints(data: bytes) -> List[int]:
+    """Decode integers encoded by `_encode_varints()`
+    """
+    # Mostly single bytes are copied at once, and only integers of several bytes are decoded one by one
+    if len(data) - len(data.translate(None, _HIGH_BYTES)) < len(data) // 16:
+        r = []
+        pos = 0
+        for m in _MULTIBYTE_RE.finditer(data):
+            start, end = m.span()
+            r += data[pos:start]
+            v = 0
+            for shift, b in enumerate(m.group()):
+                v |= (b & 0x7f) << 7 * shift
+            r.append(v)
+            pos = end
+        r += data[pos:]
+
+        return r
+
+    r = []
+    append = r.append
+    v = shift = 0
+
+    for b in data:
+        if b < 0x80:
+            if shift:
+                append(v | b << shift)
+                v = shift = 0
+            else:
+                append(b)
+        else:
+            v |= (b & 0x7f) << shift
+            shift += 7
+
+    return r
+
+
+def dumps(node: Node) -> bytes:
+    """Serialize a tree into compact binary data
+
+    Data consists of tables of strings, node classes, sets of attributes' names and attributes' values, followed by
+    nodes in postorder: an index of the node's class, then either the text's index in the table of strings, or
+    indexes of element's attributes' names and values, and the number of its children. Every distinct string, set of
+    names and value is stored once. Integers are encoded as varints, strings are concatenated into a single UTF-8 block
+    at the end. Values of attributes can be strings, booleans, `None`, numbers and CSS classes.
+    """
+    ints = []  # type: List[int]
+    emit = ints.append
+    strings = {}  # type: Dict[str, int]
+    classes = {}  # type: Dict[type, Tuple[int, int]]
+    shapes = {}  # type: Dict[tuple, int]
+    values = {}  # type: Dict[tuple, int]
+
+    def string(s: str) -> int:
+        i = strings.get(s)
+        if i is None:
+            i = strings[s] = len(strings)
+
+        return i
+
+    stack = [(node, False)]
+    pop = stack.pop
+    push = stack.append
+
+    while stack:
+        node, visited = pop()
+        cls = node.__class__
+
+        entry = classes.get(cls)
+        if entry is None:
+            if cls not in _names:
+                raise TypeError(f'{cls} cannot be serialized, see register_node_class()')
+            entry = classes[cls] = (len(classes), _registry[_names[cls]][1])
+        class_id, kind = entry
+
+        if node._dict_state and node.__dict__:
+            raise TypeError(f'{cls} node has instance attributes which cannot be serialized')
+
+        if kind == _TEXT:
+            # Only texts are added to strings while walking the tree, so a new one gets the next index
+            i = strings.get(node._content)
+            if i is None:
+                strings[node._content] = len(strings)
+                emit(class_id << 1 | 1)
+            else:
+                emit(class_id << 1)
+                emit(i)
+
+        elif kind == _ELEMENT:
+            if not visited:
+                push((node, True))
+                stack.extend((child, False) for child in reversed(node._children))
+                continue
+
+            attrs = node._attrs
+            if attrs is None:
+                emit(class_id << 1)
+            else:
+                emit(class_id << 1 | 1)
+
+                shape = tuple(attrs)
+                shape_id = shapes.get(shape)
+                if shape_id is None:
+                    shape_id = shapes[shape] = len(shapes)
+                emit(shape_id)
+
+                for k, v in attrs.items():
+                    # Equal values of different types, like 1 and True, are different
+                    v_cls = v.__class__
+                    if v_cls in _VALUE_CLASSES:
+                        key = (v_cls, v)
+                    elif v_cls is CssClasses or isinstance(v, str):
+                        key = (v_cls if v_cls is CssClasses else str, str(v))
+                    else:
+                        raise TypeError(f'{type(v)} value of {k!r} attribute cannot be serialized')
+
+                    value_id = values.get(key)
+                    if value_id is None:
+                        value_id = values[key] = len(values)
+                    emit(value_id)
+
+            # Indexes of descendants' IDs are rebuilt only where there are any
+            emit(len(node._children) << 1 | bool(node._ids))
+
+        else:
+            if not visited:
+                push((node, True))
+                push((node._node, False))
+                continue
+            emit(class_id << 1)
+
+    tables = [len(classes)]
+    tables.extend(string(_names[cls]) for cls in classes)
+
+    tables.append(len(shapes))
+    for shape in shapes:
+        tables.append(len(shape))
+        tables.extend(string(k) for k in shape)
+
+    tables.append(len(values))
+    for v_cls, v in values:
+        _encode_value(v_cls, v, tables, string)
+
+    # Strings go first, so their lengths are taken after all of them are collected
+    header = [len(strings)]
+    header.extend(len(s) for s in strings)
+
+    data = _encode_varints(header) + _encode_varints(tables) + _encode_varints(ints)
+
+    return b''.join((MAGIC, bytes((FORMAT_VERSION,)), len(data).to_bytes(4, 'little'), data,
+                     ''.join(strings).encode()))
+
+
+def _encode_value(cls: type, v, ints: List[int], string: Callable[[str], int]):
+    """Encode a value of an attribute as an integer code, followed by indexes of CSS classes if it is a set of them
+    """
+    if cls is CssClasses:
+        css = v.split()
+        ints.append(len(css) << _VALUE_BITS | _VALUE_CSS)
+        ints.extend(string(s) for s in css)
+    elif cls is bool:
+        ints.append(v << _VALUE_BITS | _VALUE_BOOL)
+    elif v is None:
+        ints.append(_VALUE_NONE)
+    elif cls is int:
+        # Signed integers are zigzag-encoded
+        ints.append((v << 1 if v >= 0 else (-v << 1) - 1) << _VALUE_BITS | _VALUE_INT)
+    elif cls is float:
+        ints.append(string(repr(v)) << _VALUE_BITS | _VALUE_FLOAT)
+    else:
+        ints.append(string(str(v)) << _VALUE_BITS | _VALUE_STR)
+
+
+def _decode_value(code: int, nxt: Callable[[], int], strings: List[str]):
+    """Decode a value of an attribute
+
+    CSS classes are decoded into a `CssClasses` used as a prototype, which is copied for every element.
+    """
+    value_type = code & _VALUE_MASK
+    v = code >> _VALUE_BITS
+
+    if value_type == _VALUE_STR:
+        return strings[v]
+    if value_type == _VALUE_CSS:
+        css = CssClasses(strings[nxt()] for _ in range(v))
+        str(css)
+        return css
+    if value_type == _VALUE_BOOL:
+        return bool(v)
+    if value_type == _VALUE_NONE:
+        return None
+    if value_type == _VALUE_INT:
+        return -(v + 1 >> 1) if v & 1 else v >> 1
+    if value_type == _VALUE_FLOAT:
+        return float(strings[v])
+
+    raise ValueError(f'unknown type of attribute value: {value_type}')
+
+
+def dump(node: Node, f: BinaryIO):
+    """Serialize a tree into a binary file
+    """
+    f.write(dumps(node))
+
+
+def loads(data: Union[bytes, bytearray, memoryview, mmap.mmap]) -> Node:
+    """Restore a tree serialized by `dumps()`
+
+    Data can be any bytes-like object, including a memory-mapped file. Its sections are sliced through a memoryview
+    rather than copying data as a whole, though the integers section is copied once for decoding, and the block of
+    strings is decoded into a single string. The garbage collector is paused while the tree is built, since lots of
+    objects are created at once.
+    """
+    with memoryview(data) as buf:
+        if len(buf) < _HEADER_SIZE or buf[:len(MAGIC)] != MAGIC:
+            raise ValueError('not a serialized HTMLer tree')
+        if buf[len(MAGIC)] != FORMAT_VERSION:
+            raise ValueError(f'unsupported format version: {buf[len(MAGIC)]}')
+
+        size = int.from_bytes(buf[len(MAGIC) + 1:_HEADER_SIZE], 'little')
+        ints = _decode_varints(bytes(buf[_HEADER_SIZE:_HEADER_SIZE + size]))
+        with buf[_HEADER_SIZE + size:] as blob_buf:
+            blob = str(blob_buf, 'utf-8')
+
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _build(iter(ints), blob)
+    except (IndexError, StopIteration):
+        raise ValueError('malformed serialized HTMLer tree')
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _build(it: Iterator[int], blob: str) -> Node:
+    """Build a tree from decoded integers and the block of strings
+    """
+    nxt = it.__next__
+
+    # Strings are sliced from the block by their lengths
+    offsets = list(accumulate(islice(it, nxt())))
+    strings = [blob[a:b] for a, b in zip([0] + offsets, offsets)]
+
+    classes = []
+    kinds = []
+    for _ in range(nxt()):
+        name = strings[nxt()]
+        if name not in _registry:
+            raise ValueError(f'unknown node class: {name}')
+        cls, kind = _registry[name]
+        classes.append(cls)
+        kinds.append(kind)
+
+    shapes = [tuple(strings[i] for i in islice(it, nxt())) for _ in range(nxt())]
+    values = []
+    for _ in range(nxt()):
+        code = nxt()
+        values.append(strings[code >> _VALUE_BITS] if code & _VALUE_MASK == _VALUE_STR else
+                      _decode_value(code, nxt, strings))
+    get_value = values.__getitem__
+    elements = {cls for cls, kind in zip(classes, kinds) if kind == _ELEMENT}
+
+    new = object.__new__
+    merge_ids = base._merge_ids
+    stack = []
+    push = stack.append
+    new_text = 0
+
+    for code in it:
+        class_id = code >> 1
+        node = new(classes[class_id])
+        kind = kinds[class_id]
+
+        if kind == _TEXT:
+            if code & 1:
+                node._content = strings[new_text]
+                new_text += 1
+            else:
+                node._content = strings[nxt()]
+
+        elif kind == _ELEMENT:
+            if code & 1:
+                shape = shapes[nxt()]
+                attrs = node._attrs = dict(zip(shape, map(get_value, islice(it, len(shape)))))
+                node._attrs_str = None
+                css = attrs.get('css')
+                if css.__class__ is CssClasses:
+                    attrs['css'] = copy = new(CssClasses)
+                    copy._classes = css._classes.copy()
+                    copy._str = css._str
+            else:
+                node._attrs = None
+                node._attrs_str = ''
+
+            node._cache = None
+            node._ids = None
+
+            n = nxt()
+            if n > 1:
+                children = stack[-(n >> 1):]
+                del stack[-(n >> 1):]
+                for child in children:
+                    child._parent = node
+                node._children = children
+
+                if n & 1:
+                    ids = node._ids = {}
+                    for child in children:
+                        if child.__class__ in elements:
+                            if child._ids:
+                                merge_ids(ids, child._ids)
+                            em_id = child._attrs and child._attrs.get('id')
+                            if em_id:
+                                merge_ids(ids, {em_id: child})
+            else:
+                node._children = []
+
+        else:
+            wrapped = stack.pop()
+            wrapped._parent = None
+            node._node = wrapped
+            node._cache = None
+
+        push(node)
+
+    if len(stack) != 1:
+        raise ValueError('malformed serialized HTMLer tree')
+
+    node = stack[0]
+    node._parent = None
+
+    return node
+
+
+def load(f: BinaryIO) -> Node:
+    """Restore a tree from a binary file written by `dump()`
+
+    Files with descriptors are memory-mapped as a whole instead of being read into a bytes object, so the file must
+    contain nothing else; other binary streams are read from the current position.
+    """
+    try:
+        fileno = f.fileno()
+    except (AttributeError, OSError):
+        return loads(f.read())
+
+    with mmap.mmap(fileno, 0, access=mmap.ACCESS_READ) as data:
+        return loads(data)
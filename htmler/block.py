@@ -5,493 +5,725 @@ __email__ = 'a@shepetko.com'
 __license__ = 'MIT'
 
 from os import environ, linesep
-from .base import Text, Element, SingleTagElement
-from .inline import InlineElement
+from typing import Callable, Dict, Iterator, Tuple, Union
+from .base import _LAYOUT_NONE, _LAYOUT_TEXT, _LAYOUT_BLOCK, _LAYOUT_OTHER, _LAYOUT_STATIC, _LAYOUT_LAZY, \
+    _LAYOUT_NEXT, Element, SingleTagElement
 
-INDENT_WIDTH = environ.get('HTMLER_INDENT_WIDTH', 4)
+INDENT_WIDTH = int(environ.get('HTMLER_INDENT_WIDTH', 4))
+
+
+class _PerDepth(dict):
+    """Values by depth, made on first use
+    """
+
+    __slots__ = ('_make',)
+
+    def __init__(self, make: Callable):
+        """Init
+        """
+        super().__init__()
+
+        self._make = make
+
+    def __missing__(self, depth: int):
+        """Make the value for a depth
+        """
+        r = self[depth] = self._make(depth)
+
+        return r
+
+
+class Indent:
+    """Indentation style of rendered output, passed as `render(indent=...)`
+
+    Levels are indented with `width` spaces or with a tab each, lines are ended with `newline`. Padding strings are
+    made once per depth and shared by all renderings, and equal styles are the same object.
+    """
+
+    __slots__ = ('_width', '_tabs', '_newline', '_paddings', '_boundaries')
+
+    _instances = {}  # type: Dict[tuple, Indent]
+
+    @property
+    def width(self) -> int:
+        """Get number of spaces per level
+        """
+        return self._width
+
+    @property
+    def tabs(self) -> bool:
+        """Check if levels are indented with tabs
+        """
+        return self._tabs
+
+    @property
+    def newline(self) -> str:
+        """Get line ending
+        """
+        return self._newline
+
+    def __new__(cls, width: int = None, tabs: bool = False, newline: str = linesep):
+        """Get an indentation style
+        """
+        if width is None:
+            width = INDENT_WIDTH
+        if not isinstance(width, int) or isinstance(width, bool):
+            raise TypeError(f'indent width must be an int, not {type(width)}')
+        if width < 0:
+            raise ValueError(f'indent width cannot be negative: {width}')
+        if not isinstance(newline, str):
+            raise TypeError(f'newline must be a str, not {type(newline)}')
+
+        key = (width, bool(tabs), newline)
+        indent = cls._instances.get(key)
+        if indent is None:
+            indent = cls._instances[key] = super().__new__(cls)
+            indent._width, indent._tabs, indent._newline = key
+            unit = '\t' if tabs else ' ' * width
+            indent._paddings = _PerDepth(lambda depth: unit * depth)
+            indent._boundaries = _PerDepth(indent._make_boundaries)
+
+        return indent
+
+    def __reduce__(self) -> tuple:
+        """Pickle the style by its parameters
+        """
+        return Indent, (self._width, self._tabs, self._newline)
+
+    def __repr__(self) -> str:
+        """__repr__()
+        """
+        return f'Indent({self._width!r}, {self._tabs!r}, {self._newline!r})'
+
+    def padding(self, depth: int) -> str:
+        """Get padding of lines at a depth
+        """
+        return self._paddings[depth]
+
+    def _make_boundaries(self, depth: int) -> Tuple[Tuple[str, ...], ...]:
+        """Make the table of whitespace put between child nodes at a depth in block layout
+
+        The table is indexed by the layout kind of a node, then by the kind of the node before it. Whitespace after the
+        last child is indexed by `_LAYOUT_NONE`.
+        """
+        padding = self._paddings[depth]
+        newline = self._newline
+
+        r = [()] * (_LAYOUT_OTHER + 1)
+        r[_LAYOUT_NONE] = ('', newline, '', '')
+        r[_LAYOUT_TEXT] = (padding, '', padding, '')
+        r[_LAYOUT_BLOCK] = ('', newline, '', '')
+        r[_LAYOUT_OTHER] = ('', '', '', '')
+
+        return tuple(r)
+
+
+DEFAULT_INDENT = Indent()
 
 
 class BlockElement(Element):
     """Block element
     """
 
-    def _render_open_tag(self, **kwargs) -> str:
+    __slots__ = ()
+
+    _layout = _LAYOUT_BLOCK
+
+    def _render_open_tag(self, indent: Union[bool, Indent] = True, depth: int = 0) -> str:
         """Render opening tag
         """
-        indent = kwargs.get('indent', True)
-        depth = kwargs.get('depth', 0)
-        r = super()._render_open_tag(**kwargs)
-
-        return ((' ' * INDENT_WIDTH * depth) + r + linesep) if indent else r
+        r = super()._render_open_tag(indent, depth)
+        if not indent:
+            return r
 
-    def _render_children(self, **kwargs) -> str:
-        indent = kwargs.get('indent', True)
-        depth = kwargs.get('depth', 0) + 1
-        r = ''
+        if indent is True:
+            indent = DEFAULT_INDENT
 
-        i = 0
-        prev_child = None
-        for child in self:
-            if indent:
-                if (i == 0 or isinstance(prev_child, BlockElement)) and isinstance(child, (Text, InlineElement)):
-                    r += ' ' * INDENT_WIDTH * depth
-                if isinstance(child, BlockElement) and isinstance(prev_child, (Text, InlineElement)):
-                    r += linesep
+        return indent._paddings[depth] + r + indent._newline
 
-            kwargs['depth'] = depth
-            r += child.render(**kwargs)
+    def _expand_children(self, indent: Union[bool, Indent], depth: int) -> Union[list, Iterator]:
+        """Expand child nodes for rendering
+        """
+        depth += 1
+        if not indent:
+            return [(child, depth) for child in self._children]
 
-            if indent and i == (len(self) - 1) and isinstance(child, (Text, InlineElement)):
-                r += linesep
+        return self._iter_layout(DEFAULT_INDENT if indent is True else indent, depth)
 
-            i += 1
-            prev_child = child
+    def _iter_layout(self, indent: Indent, depth: int) -> Iterator:
+        """Lay out child nodes with indentation
 
-        return r
+        Whitespace between children is taken from a table by layout kinds of the child and of the previous one, see
+        `Indent._make_boundaries()`. Children produced by `LazyChildren` and `AsyncChildren` are laid out as they are
+        produced.
+        """
+        boundaries = indent._boundaries[depth]
+
+        sources = [iter(self._children)]
+        prev = _LAYOUT_NONE
+        while sources:
+            for node in sources[-1]:
+                kind = node._layout
+
+                if kind > _LAYOUT_OTHER:
+                    # Children produced by `AsyncChildren` are requested from the renderer
+                    if kind == _LAYOUT_NEXT:
+                        node = yield node
+                        if node is None:
+                            continue
+                        kind = node._layout
+
+                    if kind == _LAYOUT_LAZY:
+                        sources.append(node._iter_children())
+                        break
+
+                    # Frozen nodes are laid out as the nodes they wrap
+                    if kind == _LAYOUT_STATIC:
+                        kind = node.node._layout
+                        if kind > _LAYOUT_OTHER:
+                            kind = _LAYOUT_OTHER
+
+                s = boundaries[kind][prev]
+                if s:
+                    yield s
+
+                yield node, depth
+                prev = kind
+            else:
+                sources.pop()
+
+        s = boundaries[_LAYOUT_NONE][prev]
+        if s:
+            yield s
+
+    def _render_close_tag(self, indent: Union[bool, Indent] = True, depth: int = 0) -> str:
+        """Render closing tag
+        """
+        r = super()._render_close_tag(indent, depth)
+        if not indent:
+            return r
 
-    def _render_close_tag(self, **kwargs) -> str:
-        indent = kwargs.get('indent', True)
-        depth = kwargs.get('depth', 0)
-        r = super()._render_close_tag(**kwargs)
+        if indent is True:
+            indent = DEFAULT_INDENT
 
-        return ((' ' * INDENT_WIDTH * depth) + r + linesep) if indent else r
+        return indent._paddings[depth] + r + indent._newline
 
 
 class Address(BlockElement):
     """ADDRESS Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Area(BlockElement, SingleTagElement):
     """AREA Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Article(BlockElement):
     """ARTICLE Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Aside(BlockElement):
     """ASIDE Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Audio(BlockElement):
     """AUDIO Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Base(BlockElement, SingleTagElement):
     """BASE Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Body(BlockElement):
     """BODY Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Blockquote(BlockElement):
     """BLOCKQUOTE Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Canvas(BlockElement):
     """CANVAS Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Caption(BlockElement):
     """CAPTION Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Col(BlockElement, SingleTagElement):
     """COL Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Colgroup(BlockElement):
     """COLGROUP Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Datalist(BlockElement):
     """DATALIST Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Dd(BlockElement):
     """DD Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Details(BlockElement):
     """DETAILS Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Dialog(BlockElement):
     """DIALOG Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Div(BlockElement):
     """DIV Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Dl(BlockElement):
     """DL Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Dt(BlockElement):
     """DT Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Embed(BlockElement, SingleTagElement):
     """EMBED Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Fieldset(BlockElement):
     """FIELDSET Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Figcaption(BlockElement):
     """FIGCAPTION Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Figure(BlockElement):
     """FIGURE Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Footer(BlockElement):
     """FOOTER Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Form(BlockElement):
     """FORM Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class H1(BlockElement):
     """H1 Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class H2(BlockElement):
     """H2 Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class H3(BlockElement):
     """H3 Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class H4(BlockElement):
     """H4 Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class H5(BlockElement):
     """H5 Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class H6(BlockElement):
     """H6 Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Head(BlockElement):
     """HEAD Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Header(BlockElement):
     """HEADER Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Hr(BlockElement):
     """HR Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Html(BlockElement):
     """HTML Element
     """
 
-    def _render_open_tag(self, **kwargs) -> str:
-        return '<!DOCTYPE html>' + (linesep if kwargs.get('indent', True) else '') + super()._render_open_tag(**kwargs)
+    __slots__ = ()
+
+    def _render_open_tag(self, indent: Union[bool, Indent] = True, depth: int = 0) -> str:
+        """Render opening tag
+        """
+        if not indent:
+            return '<!DOCTYPE html>' + super()._render_open_tag(indent, depth)
+
+        return '<!DOCTYPE html>' + (DEFAULT_INDENT if indent is True else indent)._newline + \
+            super()._render_open_tag(indent, depth)
 
 
 class Iframe(BlockElement):
     """IFRAME Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Li(BlockElement):
     """LI Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Link(BlockElement, SingleTagElement):
     """LINK Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Main(BlockElement, SingleTagElement):
     """MAIN Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Map(BlockElement):
     """MAP Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Menu(BlockElement):
     """MENU Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Meta(BlockElement, SingleTagElement):
     """META Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Nav(BlockElement):
     """NAV Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Noscript(BlockElement):
     """NOSCRIPT Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Object(BlockElement):
     """OBJECT Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Ol(BlockElement):
     """OL Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Optgroup(BlockElement):
     """OPTGROUP Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Option(BlockElement):
     """OPTION Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class P(BlockElement):
     """P Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Param(BlockElement, SingleTagElement):
     """PARAM Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Pre(BlockElement):
     """PRE Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Progress(BlockElement):
     """PROGRESS Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Ruby(BlockElement):
     """RUBY Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Samp(BlockElement):
     """SAMP Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Script(BlockElement):
     """SCRIPT Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Section(BlockElement):
     """SECTION Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Select(BlockElement):
     """SELECT Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Slot(BlockElement):
     """SLOT Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Source(BlockElement, SingleTagElement):
     """SOURCE Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Style(BlockElement):
     """STYLE Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Summary(BlockElement):
     """SUMMARY Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Table(BlockElement):
     """TABLE Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Tbody(BlockElement):
     """TBODY Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Td(BlockElement):
     """TD Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Template(BlockElement):
     """TEMPLATE Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Tfoot(BlockElement):
     """TFOOT Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Th(BlockElement):
     """TH Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Thead(BlockElement):
     """THEAD Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Title(BlockElement):
     """TITLE Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Tr(BlockElement):
     """TR Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Track(BlockElement, SingleTagElement):
     """TRACK Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Ul(BlockElement):
     """UL Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Video(BlockElement):
     """VIDEO Element
     """
-    pass
+
+    __slots__ = ()
@@ -0,0 +1,89 @@
+"""HTMLer Compressed Rendering
+"""
+__author__ = 'Oleksandr Shepetko'
+__email__ = 'a@shepetko.com'
+__license__ = 'MIT'
+
+import zlib
+from codecs import getincrementalencoder
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+try:
+    import bz2
+except ImportError:  # pragma: no cover
+    bz2 = None
+
+try:
+    import lzma
+except ImportError:  # pragma: no cover
+    lzma = None
+
+# Compressor factories and modes of flushing compressors without ending streams, by codec names
+COMPRESSION_CODECS = {}  # type: Dict[str, Tuple[Callable, Optional[int]]]
+
+
+def register_codec(name: str, factory: Callable, flush_mode: Optional[int] = None):
+    """Register a compression codec
+
+    `factory` is called with a compression level, which is `None` if not given, and must return an object with
+    `compress(data)` and `flush([mode])` methods, like the ones of `zlib`, `bz2` and `lzma` modules. If the codec
+    supports flushing without ending the stream, `flush_mode` is the mode to pass to `flush()` for that.
+    """
+    COMPRESSION_CODECS[name] = (factory, flush_mode)
+
+
+def _zlib_factory(wbits: int) -> Callable:
+    """Get a factory of zlib compressors producing a given format
+    """
+    def factory(level: Optional[int]):
+        return zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION if level is None else level, zlib.DEFLATED, wbits)
+
+    return factory
+
+
+register_codec('gzip', _zlib_factory(16 + zlib.MAX_WBITS), zlib.Z_SYNC_FLUSH)
+register_codec('zlib', _zlib_factory(zlib.MAX_WBITS), zlib.Z_SYNC_FLUSH)
+register_codec('deflate', _zlib_factory(-zlib.MAX_WBITS), zlib.Z_SYNC_FLUSH)
+
+if bz2:
+    register_codec('bz2', lambda level: bz2.BZ2Compressor(9 if level is None else level))
+
+if lzma:
+    register_codec('lzma', lambda level: lzma.LZMACompressor(preset=level))
+
+
+def compress_chunks(chunks: Iterable[str], codec: str = 'gzip', level: Optional[int] = None,
+                    encoding: str = 'utf-8', flush: bool = False) -> Iterator[bytes]:
+    """Encode and compress chunks of text as they are produced
+
+    With `flush`, compressed data of every chunk is flushed, so a receiver can decompress it without waiting for the
+    rest of the stream. Only codecs registered with a flush mode support that.
+    """
+    try:
+        factory, flush_mode = COMPRESSION_CODECS[codec]
+    except KeyError:
+        raise ValueError(f'unknown compression codec: {codec!r}')
+
+    if flush and flush_mode is None:
+        raise ValueError(f'{codec} compression codec does not support flushing')
+
+    encode = getincrementalencoder(encoding)().encode
+
+    return _iter_compressed(chunks, factory(level), encode, flush_mode if flush else None)
+
+
+def _iter_compressed(chunks: Iterable[str], compressor, encode: Callable, flush_mode: Optional[int]) -> Iterator[bytes]:
+    """Encode and compress chunks of text
+    """
+    compress = compressor.compress
+
+    for chunk in chunks:
+        data = compress(encode(chunk))
+        if flush_mode is not None:
+            data += compressor.flush(flush_mode)
+        if data:
+            yield data
+
+    data = compress(encode('', True)) + compressor.flush()
+    if data:
+        yield data
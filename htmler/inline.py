@@ -4,244 +4,286 @@ __author__ = 'Oleksandr Shepetko'
 __email__ = 'a@shepetko.com'
 __license__ = 'MIT'
 
-from .base import Element, SingleTagElement
+from .base import _LAYOUT_TEXT, Element, SingleTagElement
 
 
 class InlineElement(Element):
     """Base Inline Element
     """
-    pass
+
+    __slots__ = ()
+
+    _layout = _LAYOUT_TEXT
 
 
 class A(InlineElement):
     """A Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Abbr(InlineElement):
     """ABBR Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class B(InlineElement):
     """B Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Bdi(InlineElement):
     """BDI Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Bdo(InlineElement):
     """BDO Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Br(InlineElement, SingleTagElement):
     """BR Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Button(InlineElement):
     """BUTTON Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Cite(InlineElement):
     """CITE Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Code(InlineElement):
     """CODE Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Data(InlineElement):
     """DATA Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Del(InlineElement):
     """DEL Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Dfn(InlineElement):
     """DFN Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Em(InlineElement):
     """EM Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class I(InlineElement):
     """I Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Img(InlineElement, SingleTagElement):
     """IMG Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Input(InlineElement, SingleTagElement):
     """INPUT Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Ins(InlineElement, SingleTagElement):
     """INS Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Kbd(InlineElement, SingleTagElement):
     """KBD Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Label(InlineElement):
     """LABEL Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Legend(InlineElement):
     """LEGEND Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Meter(InlineElement):
     """METER Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Mark(InlineElement):
     """MARK Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Output(InlineElement):
     """OUTPUT Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Progress(InlineElement):
     """PROGRESS Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Q(InlineElement):
     """Q Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Rp(InlineElement):
     """RP Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Rt(InlineElement):
     """RT Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Rtc(InlineElement):
     """RTC Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class S(InlineElement):
     """S Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Small(InlineElement):
     """SMALL Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Span(InlineElement):
     """SPAN Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Strong(InlineElement):
     """STRONG Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Sub(InlineElement):
     """SUB Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Sup(InlineElement):
     """SUP Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Textarea(InlineElement):
     """TEXTAREA Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Time(InlineElement):
     """TIME Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class U(InlineElement):
     """U Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Var(InlineElement):
     """VAR Element
     """
-    pass
+
+    __slots__ = ()
 
 
 class Wbr(InlineElement):
     """WBR Element
     """
-    pass
+
+    __slots__ = ()
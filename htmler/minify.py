@@ -0,0 +1,242 @@
+"""HTMLer Minified Rendering
+"""
+__author__ = 'Oleksandr Shepetko'
+__email__ = 'a@shepetko.com'
+__license__ = 'MIT'
+
+import re
+from itertools import repeat
+from typing import Dict, Iterable, Iterator, Optional, Union
+from . import base, block, inline
+from .base import ATTRS_STR_CACHE_SIZE, Node, Text, Comment, Static, Element, SingleTagElement, TagLessElement, \
+    NextChild, html_attrs_str_cached, render_fragments
+from .block import Html
+
+# Elements whose text is rendered as is
+_PREFORMATTED = frozenset(('pre', 'textarea', 'script', 'style'))
+
+# Closing tags which may be omitted if the element is followed by one of the elements, or, if `True` is in the set,
+# there is no more content in the parent element. See https://html.spec.whatwg.org/#optional-tags.
+_P_FOLLOWERS = ('address', 'article', 'aside', 'blockquote', 'details', 'div', 'dl', 'fieldset', 'figcaption', 'figure',
+                'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hgroup', 'hr', 'main', 'menu', 'nav',
+                'ol', 'p', 'pre', 'section', 'table', 'ul')
+_OPTIONAL_CLOSING_TAGS = {
+    'li': frozenset(('li', True)),
+    'dt': frozenset(('dt', 'dd')),
+    'dd': frozenset(('dd', 'dt', True)),
+    'p': frozenset(_P_FOLLOWERS + (True,)),
+    'optgroup': frozenset(('optgroup', True)),
+    'option': frozenset(('option', 'optgroup', True)),
+    'thead': frozenset(('tbody', 'tfoot')),
+    'tbody': frozenset(('tbody', 'tfoot', True)),
+    'tfoot': frozenset((True,)),
+    'tr': frozenset(('tr', True)),
+    'td': frozenset(('td', 'th', True)),
+    'th': frozenset(('td', 'th', True)),
+    'head': frozenset(_P_FOLLOWERS + ('body',)),
+    'body': frozenset((True,)),
+    'html': frozenset((True,)),
+}
+
+# Parents in which closing tag of the last paragraph may not be omitted
+_P_KEEPING_PARENTS = frozenset(('a', 'audio', 'del', 'ins', 'map', 'noscript', 'video'))
+
+# Runs of whitespace other than single spaces
+_WHITESPACE_RE = re.compile(r'[\t\n\r\f][ \t\n\r\f]*| [ \t\n\r\f]+')
+_QUOTED_VALUE_RE = re.compile(r'="([^ \t\n\r\f"\'=<>`]+)"')
+
+_UNKNOWN = object()  # unknown next sibling
+
+# Kinds of nodes, by classes
+_TEXT = 1
+_STATIC = 2
+_TAGLESS = 3
+_SINGLE = 4
+_HTML = 5
+_ELEMENT = 6
+_OTHER = 7
+_kinds = {}  # type: Dict[type, int]
+
+# Rendering hooks of elements, and their implementations by htmler itself; elements overriding any of them are rendered
+# by their own hooks, without minifying
+_HOOKS = ('_expand', '_expand_children', '_render_open_tag', '_render_close_tag')
+_BUILTIN_HOOKS = frozenset(getattr(cls, hook) for module in (base, block, inline) for cls in vars(module).values()
+                           if isinstance(cls, type) and issubclass(cls, Element) for hook in _HOOKS)
+
+_attrs_str_cache = {}
+
+
+def minify_attrs_str(attrs_str: str) -> str:
+    """Drop quotes around attributes' values which do not need them
+    """
+    r = _attrs_str_cache.get(attrs_str)
+    if r is None:
+        if len(_attrs_str_cache) >= ATTRS_STR_CACHE_SIZE:
+            _attrs_str_cache.clear()
+        r = _attrs_str_cache[attrs_str] = _QUOTED_VALUE_RE.sub(r'=\1', attrs_str)
+
+    return r
+
+
+def _closing_tag_optional(name: str, next_node, parent: Optional[Element]) -> bool:
+    """Check if closing tag of an element may be omitted
+    """
+    followers = _OPTIONAL_CLOSING_TAGS.get(name)
+    if followers is None or next_node is _UNKNOWN:
+        return False
+
+    if next_node is None:
+        return True in followers and not (name == 'p' and (parent is None or parent._name in _P_KEEPING_PARENTS))
+
+    if isinstance(next_node, Static):
+        next_node = next_node.node
+
+    return isinstance(next_node, Element) and not isinstance(next_node, TagLessElement) and \
+        next_node._name in followers
+
+
+def _flatten(children: Iterable[Node]) -> Iterator[Node]:
+    """Produce child nodes, replacing lazy ones with the nodes they produce
+    """
+    for child in children:
+        if child._lazy:
+            for node in child._iter_children():
+                if node.__class__ is NextChild:
+                    raise TypeError('async children can be rendered only by arender() and aiter_render()')
+                yield node
+        else:
+            yield child
+
+
+def _iter_children(children: Iterable[Node], last_next, em: Element, preformatted: bool) -> Iterator[tuple]:
+    """Produce child nodes along with their next siblings, consuming lazy children as they are produced
+    """
+    prev = None
+    for node in _flatten(children):
+        if prev is not None:
+            yield prev, node, em, preformatted
+        prev = node
+
+    if prev is not None:
+        yield prev, last_next, em, preformatted
+
+
+def _expand_children(em: Element, last_next, preformatted: bool) -> Union[list, Iterator[tuple]]:
+    """Expand child nodes of an element along with their next siblings
+
+    Returns either a list of them in reverse order, ready to be pushed onto the render stack, or, if some children are
+    lazy, an iterator producing them in document order.
+    """
+    children = em._children
+    for child in children:
+        if child._lazy:
+            return _iter_children(children, last_next, em, preformatted)
+
+    r = list(zip(children, children[1:] + [last_next], repeat(em), repeat(preformatted)))
+    r.reverse()
+
+    return r
+
+
+def _kind(cls: type) -> int:
+    """Get the kind of nodes of a class
+    """
+    if issubclass(cls, Static):
+        kind = _STATIC
+    elif issubclass(cls, Comment):
+        kind = _OTHER
+    elif issubclass(cls, Text):
+        kind = _TEXT
+    elif issubclass(cls, Element) and any(getattr(cls, hook) not in _BUILTIN_HOOKS for hook in _HOOKS):
+        kind = _OTHER
+    elif issubclass(cls, TagLessElement):
+        kind = _TAGLESS
+    elif issubclass(cls, SingleTagElement):
+        kind = _SINGLE
+    elif issubclass(cls, Html):
+        kind = _HTML
+    elif issubclass(cls, Element):
+        kind = _ELEMENT
+    else:
+        kind = _OTHER
+
+    _kinds[cls] = kind
+
+    return kind
+
+
+def minify_fragments(node: Node) -> Iterator[str]:
+    """Yield minified rendered fragments of a tree in document order
+
+    Runs of whitespace in text are collapsed into single spaces, except for text in `Pre`, `Textarea`, `Script` and
+    `Style` elements; optional closing tags are omitted, and quotes are dropped around attributes' values which do not
+    need them. Like `render_fragments()`, the tree is walked with an explicit stack.
+    """
+    # Nothing follows a document, while a fragment may be followed by anything
+    stack = [(node, None if isinstance(node, Html) else _UNKNOWN, None, False)]
+    pop = stack.pop
+    push = stack.append
+    extend = stack.extend
+    kinds = _kinds
+    collapse = _WHITESPACE_RE.sub
+    optional = _OPTIONAL_CLOSING_TAGS
+
+    while stack:
+        item = pop()
+        cls = item.__class__
+
+        if cls is tuple:
+            node, next_node, parent, preformatted = item
+            kind = kinds.get(node.__class__) or _kind(node.__class__)
+            if kind is _STATIC:
+                node = node.node
+                kind = kinds.get(node.__class__) or _kind(node.__class__)
+
+            if kind is _TEXT:
+                s = node._expand(False, 0)
+                # Most text has nothing to collapse, which is cheaper to check without the regular expression
+                if not preformatted and ('  ' in s or '\n' in s or '\t' in s or '\r' in s or '\f' in s):
+                    s = collapse(' ', s)
+                if s:
+                    yield s
+
+            elif kind is _OTHER:
+                yield from render_fragments(node, False, 0)
+
+            elif kind is _TAGLESS:
+                # Children of an element without tags are followed by the element's siblings, which are not known here
+                r = _expand_children(node, _UNKNOWN, preformatted)
+                if r.__class__ is list:
+                    extend(r)
+                else:
+                    push(r)
+
+            else:
+                attrs_str = node._attrs_str
+                if attrs_str is None:
+                    attrs_str = node._attrs_str = html_attrs_str_cached(node._attrs)
+                if attrs_str:
+                    attrs_str = minify_attrs_str(attrs_str)
+
+                name = node._name
+                yield f'<!DOCTYPE html><{name}{attrs_str}>' if kind is _HTML else f'<{name}{attrs_str}>'
+
+                if kind is not _SINGLE:
+                    if name not in optional or not _closing_tag_optional(name, next_node, parent):
+                        push(f'</{name}>')
+
+                    r = _expand_children(node, None, preformatted or name in _PREFORMATTED)
+                    if r.__class__ is list:
+                        extend(r)
+                    else:
+                        push(r)
+
+        elif cls is str:
+            yield item
+
+        # Iterator producing children lazily, take the next one
+        else:
+            for next_item in item:
+                push(item)
+                push(next_item)
+                break
@@ -0,0 +1,227 @@
+"""HTMLer Parallel Rendering
+"""
+__author__ = 'Oleksandr Shepetko'
+__email__ = 'a@shepetko.com'
+__license__ = 'MIT'
+
+import gc
+import pickle
+from copy import copy
+from concurrent.futures import Future, ProcessPoolExecutor
+from os import cpu_count
+from typing import Dict, List, Optional, Sequence, Union
+from .base import Node, Static, Element, render_fragments, _LAYOUT_BLOCK
+from .block import BlockElement
+
+PARALLEL_THRESHOLD = 20000  # nodes
+PARALLEL_MIN_BATCH = 2000  # nodes
+
+
+def _render_batch(nodes: Sequence[Node], indent: bool, depth: int) -> str:
+    """Render sibling nodes
+    """
+    return ''.join(fragment for node in nodes for fragment in render_fragments(node, indent, depth))
+
+
+def _without_gc(f, *args):
+    """Call a function with the garbage collector disabled
+
+    Pickling creates or visits lots of objects at once, triggering full collections of a large heap several times.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return f(*args)
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _render_pickled(data: bytes, indent: bool, depth: int) -> str:
+    """Render pickled sibling nodes in a worker process
+    """
+    return _render_batch(_without_gc(pickle.loads, data), indent, depth)
+
+
+def _subtree_sizes(root: Node) -> Dict[int, int]:
+    """Count nodes in every subtree, by IDs of subtrees' roots
+    """
+    sizes = {}
+    stack = [(root, False)]
+    while stack:
+        node, visited = stack.pop()
+        if visited:
+            sizes[id(node)] = 1 + sum(sizes[id(child)] for child in node._children)
+        else:
+            stack.append((node, True))
+            stack.extend((child, False) for child in node._children)
+
+    return sizes
+
+
+class _Batch:
+    """Run of sibling subtrees rendered by a worker process, in place of the subtrees
+    """
+
+    __slots__ = ('nodes',)
+
+    # Only block elements are batched in block layout
+    _layout = _LAYOUT_BLOCK
+
+    def __init__(self, nodes: List[Node]):
+        """Init
+        """
+        self.nodes = nodes
+
+
+def _close_batch(batch: List[Node], batch_nodes: int, batch_size: int) -> list:
+    """Get children to render in place of a run of siblings, which is batched if it is large enough
+    """
+    return [_Batch(batch)] if batch_nodes >= batch_size // 2 else batch
+
+
+def _with_children(em: Element, children: list) -> Element:
+    """Make a shallow copy of an element to render with other children
+    """
+    em = copy(em)
+    em._children = children
+
+    return em
+
+
+class ParallelRenderer:
+    """Renderer of large trees in a process pool
+
+    Runs of sibling subtrees, a few for every worker, are pickled and rendered by worker processes, while the rest of
+    the tree is rendered by the calling process. Trees smaller than `threshold` nodes are
+    rendered serially. Subtrees which cannot be pickled, like ones containing generators or lambdas, are rendered by
+    the calling process too.
+    """
+
+    def __init__(self, workers: Optional[int] = None, threshold: int = PARALLEL_THRESHOLD):
+        """Init
+        """
+        self._workers = workers or cpu_count() or 1
+        self._threshold = threshold
+        self._executor = None  # type: Optional[ProcessPoolExecutor]
+
+    def __enter__(self):
+        """Enter the runtime context
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Exit the runtime context
+        """
+        self.close()
+
+    def close(self):
+        """Shut the process pool down
+        """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def _plan(self, root: Node, indent: bool, sizes: Dict[int, int]) -> Dict[int, list]:
+        """Split the tree into batches of sibling subtrees to render in worker processes
+
+        A node can be a child of several elements, so batches are bound to their parents rather than to their nodes.
+
+        :return: children of elements with runs of them replaced with batches, by IDs of the elements
+        """
+        batch_size = max(sizes[id(root)] // (self._workers * 4), PARALLEL_MIN_BATCH, self._threshold // 16)
+        plan = {}
+
+        stack = [root]
+        while stack:
+            em = stack.pop()
+            if id(em) in plan:
+                continue
+
+            # Siblings are rendered separately, so whitespace between them must not depend on their neighbours
+            layout = indent and isinstance(em, BlockElement)
+
+            children = []
+            batch = []
+            batch_nodes = 0
+            for child in em._children:
+                size = sizes[id(child)]
+                if size > batch_size:
+                    if isinstance(child, Element):
+                        stack.append(child)
+                elif not child._lazy and (not layout or isinstance(
+                        child.node if isinstance(child, Static) else child, BlockElement)):
+                    batch.append(child)
+                    batch_nodes += size
+                    if batch_nodes >= batch_size:
+                        children.append(_Batch(batch))
+                        batch = []
+                        batch_nodes = 0
+                    continue
+
+                children += _close_batch(batch, batch_nodes, batch_size)
+                children.append(child)
+                batch = []
+                batch_nodes = 0
+
+            children += _close_batch(batch, batch_nodes, batch_size)
+            plan[id(em)] = children
+
+        return {k: children for k, children in plan.items() if any(child.__class__ is _Batch for child in children)}
+
+    def render(self, node: Node, indent: bool = True, depth: int = 0) -> str:
+        """Render a tree
+        """
+        if self._workers < 2 or node._lazy:
+            return ''.join(render_fragments(node, indent, depth))
+
+        sizes = _subtree_sizes(node)
+        plan = self._plan(node, indent, sizes) if sizes[id(node)] >= self._threshold else None
+        if not plan:
+            return ''.join(render_fragments(node, indent, depth))
+
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(self._workers)
+
+        out = []  # type: List[Union[str, Future]]
+
+        # Same as render_fragments(), except that batches are submitted to the pool instead of being expanded
+        stack = [(node, depth)]
+        while stack:
+            item = stack.pop()
+            cls = item.__class__
+
+            if cls is tuple:
+                node, depth = item
+                if node.__class__ is _Batch:
+                    try:
+                        data = _without_gc(pickle.dumps, node.nodes, pickle.HIGHEST_PROTOCOL)
+                    except (pickle.PicklingError, TypeError, AttributeError, RecursionError):
+                        # Generators, lambdas and too deep trees cannot be pickled
+                        out.append(_render_batch(node.nodes, indent, depth))
+                    else:
+                        out.append(self._executor.submit(_render_pickled, data, indent, depth))
+                    continue
+
+                children = plan.get(id(node))
+                if children is not None:
+                    node = _with_children(node, children)
+
+                item = node._expand(indent, depth)
+                if item.__class__ is list:
+                    item.reverse()
+                    stack.extend(item)
+                elif item:
+                    out.append(item)
+
+            elif isinstance(item, str):
+                if item:
+                    out.append(item)
+
+            else:
+                for next_item in item:
+                    stack.append(item)
+                    stack.append(next_item)
+                    break
+
+        return ''.join(s.result() if isinstance(s, Future) else s for s in out)
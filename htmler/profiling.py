@@ -0,0 +1,183 @@
+"""HTMLer Render Profiling
+"""
+__author__ = 'Oleksandr Shepetko'
+__email__ = 'a@shepetko.com'
+__license__ = 'MIT'
+
+from time import perf_counter
+from typing import Dict, Iterator, List, Tuple
+
+# Indexes of statistics in records
+_COUNT = 0
+_TOTAL_TIME = 1
+_SELF_TIME = 2
+_CHARS = 3
+_SELF_CHARS = 4
+
+_END = object()  # marks the end of an element's output on the render stack
+
+
+class RenderProfile:
+    """Statistics of rendering, collected by `render(profile=...)`
+
+    For every node name (tag) and every path of names from the root (subtree) it counts rendered nodes, time spent on
+    rendering them including descendants and excluding them (self time), and characters emitted, including and
+    excluding descendants. Time of nested nodes with the same name is counted once. Statistics of several renderings
+    are summed up.
+    """
+
+    def __init__(self):
+        """Init
+        """
+        self._tags = {}  # type: Dict[str, List]
+        self._paths = {}  # type: Dict[Tuple[int, str], int]
+        self._path_names = [()]  # type: List[Tuple[str, ...]]
+        self._path_stats = [None]  # type: List[List]
+
+    def _path(self, parent: int, name: str) -> int:
+        """Get the ID of a path, registering it if necessary
+        """
+        key = (parent, name)
+        path = self._paths.get(key)
+        if path is None:
+            path = self._paths[key] = len(self._path_names)
+            self._path_names.append(self._path_names[parent] + (name,))
+            self._path_stats.append([0, 0.0, 0.0, 0, 0])
+
+        return path
+
+    def _record(self, name: str, path: int, total_time: float, self_time: float, chars: int, self_chars: int,
+                outermost: bool):
+        """Record statistics of a rendered node
+        """
+        tag = self._tags.get(name)
+        if tag is None:
+            tag = self._tags[name] = [0, 0.0, 0.0, 0, 0]
+
+        tag[_COUNT] += 1
+        tag[_SELF_TIME] += self_time
+        tag[_SELF_CHARS] += self_chars
+        if outermost:
+            tag[_TOTAL_TIME] += total_time
+            tag[_CHARS] += chars
+
+        stats = self._path_stats[path]
+        stats[_COUNT] += 1
+        stats[_TOTAL_TIME] += total_time
+        stats[_SELF_TIME] += self_time
+        stats[_CHARS] += chars
+        stats[_SELF_CHARS] += self_chars
+
+    @staticmethod
+    def _stats_dict(stats: List) -> dict:
+        """Convert statistics to a dictionary
+        """
+        return {
+            'count': stats[_COUNT],
+            'total_time': stats[_TOTAL_TIME],
+            'self_time': stats[_SELF_TIME],
+            'chars': stats[_CHARS],
+            'self_chars': stats[_SELF_CHARS],
+        }
+
+    def as_dict(self) -> dict:
+        """Get statistics per tag and per subtree, the latter by names joined with ';'
+
+        Times are in seconds.
+        """
+        return {
+            'tags': {name: self._stats_dict(stats) for name, stats in self._tags.items()},
+            'subtrees': {';'.join(self._path_names[path]): self._stats_dict(self._path_stats[path])
+                         for path in range(1, len(self._path_names))},
+        }
+
+    def collapsed(self, metric: str = 'time') -> str:
+        """Get self time in microseconds or self characters of every subtree, in the collapsed stacks format
+
+        The output can be fed to flame graph tools like `flamegraph.pl` or speedscope.
+        """
+        if metric not in ('time', 'chars'):
+            raise ValueError(f"invalid metric: {metric!r}, expected 'time' or 'chars'")
+
+        lines = []
+        for path in range(1, len(self._path_names)):
+            stats = self._path_stats[path]
+            value = round(stats[_SELF_TIME] * 1e6) if metric == 'time' else stats[_SELF_CHARS]
+            if value:
+                lines.append(f"{';'.join(self._path_names[path])} {value}")
+
+        return '\n'.join(lines) + '\n' if lines else ''
+
+
+def profile_fragments(node, indent: bool, depth: int, profile: RenderProfile) -> Iterator[str]:
+    """Yield rendered fragments of a tree in document order, collecting statistics
+
+    Works as `render_fragments()` does, but separately from it, so rendering without profiling is not slowed down.
+    Time spent by the consumer of fragments is not counted.
+    """
+    stack = [(node, depth)]
+    pop = stack.pop
+    push = stack.append
+
+    # Frames of elements being rendered: [name, path, started, paused, chars, children time, children chars]
+    frames = []
+    active = {}  # number of frames by names
+    paused = 0.0  # time spent by the consumer
+    chars = 0
+
+    while stack:
+        item = pop()
+        cls = item.__class__
+
+        if cls is tuple:
+            node, depth = item
+            name = node._name
+            path = profile._path(frames[-1][1] if frames else 0, name)
+            started = perf_counter()
+            item = node._expand(indent, depth)
+
+            if item.__class__ is list:
+                frames.append([name, path, started, paused, chars, 0.0, 0])
+                active[name] = active.get(name, 0) + 1
+                push(_END)
+                item.reverse()
+                stack.extend(item)
+                continue
+
+            elapsed = perf_counter() - started
+            if item:
+                t = perf_counter()
+                yield item
+                paused += perf_counter() - t
+                chars += len(item)
+
+            profile._record(name, path, elapsed, elapsed, len(item), len(item), not active.get(name))
+            if frames:
+                frames[-1][5] += elapsed
+                frames[-1][6] += len(item)
+
+        elif item is _END:
+            name, path, started, frame_paused, frame_chars, children_time, children_chars = frames.pop()
+            active[name] -= 1
+            total_time = perf_counter() - started - (paused - frame_paused)
+            total_chars = chars - frame_chars
+
+            profile._record(name, path, total_time, total_time - children_time, total_chars,
+                            total_chars - children_chars, not active[name])
+            if frames:
+                frames[-1][5] += total_time
+                frames[-1][6] += total_chars
+
+        elif cls is str or isinstance(item, str):
+            if item:
+                t = perf_counter()
+                yield item
+                paused += perf_counter() - t
+                chars += len(item)
+
+        # Iterator producing items lazily, take the next one
+        else:
+            for next_item in item:
+                push(item)
+                push(next_item)
+                break
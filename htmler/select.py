@@ -0,0 +1,298 @@
+"""HTMLer Selectors
+
+Supported is a subset of CSS selectors: type (`div`, `*`), ID (`#main`), class (`.item`) and attribute (`[href]`,
+`[type=text]`, `[class~=a]`, `[lang|=en]`, `[href^=http]`, `[href$=".pdf"]`, `[href*=example]`) selectors, combined
+with descendant (`nav a`) and child (`ul > li`) combinators, and grouped with commas.
+"""
+__author__ = 'Oleksandr Shepetko'
+__email__ = 'a@shepetko.com'
+__license__ = 'MIT'
+
+import re
+from functools import lru_cache
+from typing import List, NamedTuple, Optional, Tuple, Union
+from .base import Element, CssClasses, html_attr_name, _NODE_SINGLE_ATTRS
+
+_SELECTOR_TOKEN_RE = re.compile(r'''
+    \s*(?P<combinator>[>,])\s*
+    | (?P<space>\s+)
+    | (?P<tag>\*|[a-zA-Z][\w-]*)
+    | \#(?P<id>[\w-]+)
+    | \.(?P<css>[\w-]+)
+    | \[\s*(?P<attr>[\w:-]+)\s*
+        (?:(?P<op>[~|^$*]?=)\s*(?:"(?P<dq_value>[^"]*)"|'(?P<sq_value>[^']*)'|(?P<value>[^\]\s'"]+))\s*)?
+      \]
+''', re.VERBOSE)
+
+
+class Compound(NamedTuple):
+    """Compound selector, like `a.external[href]`
+    """
+    tag: Optional[str]
+    id: Optional[str]
+    classes: Tuple[str, ...]
+    attrs: Tuple[Tuple[str, Optional[str], Optional[str]], ...]
+
+
+class Selector(NamedTuple):
+    """Complex selector
+
+    Compounds go from right to left, `combinators[i]` relates `compounds[i]` to `compounds[i + 1]`.
+    """
+    compounds: Tuple[Compound, ...]
+    combinators: Tuple[str, ...]
+
+
+class Index:
+    """Descendant elements of an element indexed by tag names and CSS classes, in document order
+    """
+
+    __slots__ = ('elements', 'by_tag', 'by_class', '_positions')
+
+    def __init__(self, root: Element):
+        """Init
+        """
+        self.elements = []  # type: List[Element]
+        self.by_tag = {}
+        self.by_class = {}
+        self._positions = None
+
+        stack = list(reversed(root._children))
+        while stack:
+            node = stack.pop()
+            if not isinstance(node, Element):
+                continue
+
+            self.elements.append(node)
+            self.by_tag.setdefault(node._name, []).append(node)
+            for css_class in _css_classes(node):
+                self.by_class.setdefault(css_class, []).append(node)
+
+            stack.extend(reversed(node._children))
+
+    @property
+    def positions(self) -> dict:
+        """Get positions of elements in document order
+        """
+        if self._positions is None:
+            self._positions = {id(em): i for i, em in enumerate(self.elements)}
+
+        return self._positions
+
+
+def _css_classes(em: Element) -> Union[CssClasses, Tuple]:
+    """Get CSS classes of an element
+    """
+    css = em._attrs.get('css') if em._attrs else None
+
+    return css if css.__class__ is CssClasses else ()
+
+
+def _parse_compound(tokens: list) -> Compound:
+    """Build a compound selector from its tokens
+    """
+    tag = None
+    em_id = None
+    classes = []
+    attrs = []
+
+    for kind, value in tokens:
+        if kind == 'tag':
+            if tag is not None:
+                raise ValueError('more than one type selector in a compound selector')
+            tag = None if value == '*' else value.lower()
+        elif kind == 'id':
+            em_id = value
+        elif kind == 'css':
+            classes.append(value)
+        else:
+            attrs.append(value)
+
+    return Compound(tag, em_id, tuple(classes), tuple(attrs))
+
+
+@lru_cache(maxsize=256)
+def parse_selector(selector: str) -> Tuple[Selector, ...]:
+    """Parse a group of selectors
+    """
+    groups = []
+    compounds = []
+    combinators = []
+    tokens = []
+
+    def end_compound(combinator: str):
+        if not tokens:
+            raise ValueError(f'invalid selector: {selector!r}')
+        compounds.append(_parse_compound(tokens))
+        combinators.append(combinator)
+        tokens.clear()
+
+    def end_selector():
+        end_compound('')
+        combinators.pop()
+        groups.append(Selector(tuple(reversed(compounds)), tuple(reversed(combinators))))
+        compounds.clear()
+        combinators.clear()
+
+    selector = selector.strip()
+    pos = 0
+    while pos < len(selector):
+        m = _SELECTOR_TOKEN_RE.match(selector, pos)
+        if not m:
+            raise ValueError(f'invalid selector: {selector!r}')
+        pos = m.end()
+
+        kind = m.lastgroup
+        if kind == 'combinator':
+            if m.group('combinator') == ',':
+                end_selector()
+            else:
+                end_compound('>')
+        elif kind == 'space':
+            end_compound(' ')
+        elif m.group('attr'):
+            value = m.group('dq_value')
+            if value is None:
+                value = m.group('sq_value')
+            if value is None:
+                value = m.group('value')
+            tokens.append(('attr', (m.group('attr').lower(), m.group('op'), value)))
+        else:
+            tokens.append((kind, m.group(kind)))
+
+    end_selector()
+
+    return tuple(groups)
+
+
+def _match_attr(em: Element, name: str, op: Optional[str], expected: Optional[str]) -> bool:
+    """Check if an element matches an attribute selector
+    """
+    for k, v in (em._attrs or {}).items():
+        if html_attr_name(k) != name or v is None:
+            continue
+
+        # Not rendered
+        if name in _NODE_SINGLE_ATTRS and not v:
+            return False
+
+        if op is None:
+            return True
+
+        value = str(v).strip()
+        if op == '=':
+            return value == expected
+        if op == '~=':
+            return expected in value.split()
+        if op == '|=':
+            return value == expected or value.startswith(expected + '-')
+        if op == '^=':
+            return bool(expected) and value.startswith(expected)
+        if op == '$=':
+            return bool(expected) and value.endswith(expected)
+        if op == '*=':
+            return bool(expected) and expected in value
+
+    return False
+
+
+def match_compound(em: Element, compound: Compound) -> bool:
+    """Check if an element matches a compound selector
+    """
+    if compound.tag is not None and em._name != compound.tag:
+        return False
+
+    if compound.id is not None and em.get_attr('id') != compound.id:
+        return False
+
+    if compound.classes:
+        classes = _css_classes(em)
+        for css_class in compound.classes:
+            if css_class not in classes:
+                return False
+
+    for name, op, value in compound.attrs:
+        if not _match_attr(em, name, op, value):
+            return False
+
+    return True
+
+
+def _match_ancestors(em: Element, selector: Selector, i: int) -> bool:
+    """Check if ancestors of an element match the rest of a selector, starting from its `i`-th compound
+    """
+    if i == len(selector.compounds):
+        return True
+
+    compound = selector.compounds[i]
+    node = em._parent
+
+    if selector.combinators[i - 1] == '>':
+        return node is not None and match_compound(node, compound) and _match_ancestors(node, selector, i + 1)
+
+    while node is not None:
+        if match_compound(node, compound) and _match_ancestors(node, selector, i + 1):
+            return True
+        node = node._parent
+
+    return False
+
+
+def match(em: Element, selector: Selector) -> bool:
+    """Check if an element matches a selector
+    """
+    return match_compound(em, selector.compounds[0]) and _match_ancestors(em, selector, 1)
+
+
+def get_index(root: Element) -> Index:
+    """Get index of descendants of an element, building it if necessary
+
+    The index is kept in the element's cache, so it is rebuilt only after the subtree changes.
+    """
+    if root._cache is None:
+        root._cache = {}
+
+    index = root._cache.get('index')
+    if index is None:
+        index = root._cache['index'] = Index(root)
+
+    return index
+
+
+def _candidates(root: Element, index: Index, compound: Compound) -> list:
+    """Get elements which may match a compound selector, in document order
+    """
+    if compound.id is not None:
+        em = root.get_element_by_id(compound.id)
+        return [em] if em is not None else []
+
+    if compound.classes:
+        return min((index.by_class.get(css_class, ()) for css_class in compound.classes), key=len)
+
+    if compound.tag is not None:
+        return index.by_tag.get(compound.tag, ())
+
+    return index.elements
+
+
+def select(root: Element, selector: str, limit: int = 0) -> List[Element]:
+    """Get descendant elements of `root` matching a selector, in document order
+    """
+    groups = parse_selector(selector)
+    index = get_index(root)
+
+    r = []
+    for sel in groups:
+        for em in _candidates(root, index, sel.compounds[0]):
+            if match(em, sel):
+                r.append(em)
+                if limit and len(r) == limit and len(groups) == 1:
+                    return r
+
+    if len(groups) > 1:
+        positions = index.positions
+        r = sorted({id(em): em for em in r}.values(), key=lambda em: positions[id(em)])
+        if limit:
+            r = r[:limit]
+
+    return r
@@ -0,0 +1,423 @@
+"""HTMLer Templates
+"""
+__author__ = 'Oleksandr Shepetko'
+__email__ = 'a@shepetko.com'
+__license__ = 'MIT'
+
+import marshal
+from importlib.util import MAGIC_NUMBER
+from os import linesep
+from typing import Any, Iterable, List, Tuple, Union
+from .base import _LAYOUT_NONE, _LAYOUT_OTHER, _LAYOUT_STATIC, _indent_mode, Node, Text, Element, escape_html, \
+    render_fragments
+from .block import Indent, DEFAULT_INDENT, BlockElement
+
+_MISSING = object()
+
+
+def _render_value(value: Any, escape: bool, indent: bool, depth: int) -> str:
+    """Render a value of a placeholder
+    """
+    if isinstance(value, Node):
+        return ''.join(render_fragments(value, indent, depth))
+
+    if not isinstance(value, str):
+        value = str(value)
+
+    return escape_html(value) if escape else value
+
+
+class _Hole(str):
+    """Rendered placeholder
+
+    Behaves as the placeholder's rendered default value, and carries everything needed to render another value in its
+    place later.
+    """
+
+    def __new__(cls, placeholder, indent: bool, depth: int):
+        """Create a hole
+        """
+        hole = super().__new__(cls, placeholder.render_value(placeholder.default, indent, depth))
+        hole.placeholder = placeholder
+        hole.indent = indent
+        hole.depth = depth
+
+        return hole
+
+    def __bool__(self) -> bool:
+        """Keep empty holes among rendered fragments
+        """
+        return True
+
+
+class Placeholder(Text):
+    """Placeholder for a value provided while rendering a compiled template
+
+    Placeholders are laid out as text nodes, so their values should be text or inline elements. Strings and other
+    non-node values are escaped unless `escape` is unset, nodes are rendered. Rendered as a part of an ordinary tree, a
+    placeholder gives its default value.
+    """
+
+    __slots__ = ('_key', '_default', '_escape')
+
+    @property
+    def key(self) -> str:
+        """Get placeholder's key
+        """
+        return self._key
+
+    @property
+    def default(self) -> Any:
+        """Get placeholder's default value
+        """
+        return self._default
+
+    def __init__(self, key: str, default: Any = '', escape: bool = True):
+        """Init
+        """
+        super().__init__()
+
+        self._key = key
+        self._default = default
+        self._escape = escape
+
+    def render_value(self, value: Any, indent: bool, depth: int) -> str:
+        """Render a value in place of the placeholder
+        """
+        return _render_value(value, self._escape, indent, depth)
+
+    def _expand(self, indent: bool, depth: int) -> str:
+        """Expand the node for rendering
+        """
+        return _Hole(self, indent, depth)
+
+
+class Loop(Node):
+    """Loop over items provided while rendering a compiled code template
+
+    The body is rendered for every item of the sequence given under the loop's key, placeholders and nested loops in
+    the body take their values from the item, which is a mapping. Body nodes are laid out as if they were children of
+    the loop's parent. Rendered as a part of an ordinary tree or of a segment template, a loop gives nothing.
+    """
+
+    __slots__ = ('_key', '_body')
+
+    _lazy = True
+
+    @property
+    def key(self) -> str:
+        """Get loop's key
+        """
+        return self._key
+
+    @property
+    def body(self) -> Tuple[Node, ...]:
+        """Get loop's body
+        """
+        return self._body
+
+    def __init__(self, key: str, *body: Union[Node, str]):
+        """Init
+        """
+        super().__init__()
+
+        self._key = key
+        self._body = tuple(Text(node) if isinstance(node, str) else node for node in body)
+
+        for node in self._body:
+            if not isinstance(node, Node):
+                raise TypeError(f'{type(node)} cannot be child of {type(self)}')
+
+    def append_child(self, child: Node):
+        """Append a child node
+        """
+        raise ValueError(f"'{self._name}' node cannot contain children")
+
+    def _iter_children(self) -> Iterable[Node]:
+        """Produce child nodes
+        """
+        return ()
+
+    def _expand(self, indent: bool, depth: int) -> str:
+        """Expand the node for rendering
+        """
+        return ''
+
+
+class SegmentTemplate:
+    """Template Compiled to Segments
+
+    Static parts of the tree are rendered once while compiling, so calling the template only renders values of
+    placeholders and joins them with the static parts.
+    """
+
+    __slots__ = ('_segments', '_holes')
+
+    def __init__(self, segments: List[Union[str, _Hole]]):
+        """Init
+        """
+        self._segments = []  # type: List[str]
+        self._holes = []  # type: List[Tuple[int, _Hole]]
+
+        for segment in segments:
+            if isinstance(segment, _Hole):
+                self._holes.append((len(self._segments), segment))
+            self._segments.append(segment)
+
+    @property
+    def keys(self) -> Tuple[str, ...]:
+        """Get keys of placeholders
+        """
+        return tuple(dict.fromkeys(hole.placeholder.key for _, hole in self._holes))
+
+    def __call__(self, **values) -> str:
+        """Render the template
+        """
+        segments = self._segments.copy()
+
+        for i, hole in self._holes:
+            placeholder = hole.placeholder
+            if placeholder.key in values:
+                segments[i] = placeholder.render_value(values[placeholder.key], hole.indent, hole.depth)
+
+        return ''.join(segments)
+
+
+def compile_template(node: Node, indent: Union[bool, Indent] = True, depth: int = 0) -> SegmentTemplate:
+    """Compile a tree containing placeholders into a template
+
+    The tree is rendered with given indentation mode and depth, lazily produced children are consumed once.
+    """
+    segments = []
+    static = []
+
+    for fragment in render_fragments(node, _indent_mode(indent), depth):
+        if fragment.__class__ is _Hole:
+            segments.append(''.join(static))
+            segments.append(fragment)
+            static = []
+        else:
+            static.append(fragment)
+
+    segments.append(''.join(static))
+
+    return SegmentTemplate([s for s in segments if s or isinstance(s, _Hole)])
+
+
+class CodeTemplate:
+    """Template Compiled to Python Code
+
+    Rendering function is generated from the tree, it appends prerendered strings and values of placeholders to the
+    output straight, without walking the tree. Compiled code can be saved to a file and loaded by other processes.
+    """
+
+    __slots__ = ('_source', '_code', '_render')
+
+    @property
+    def source(self) -> str:
+        """Get source code of the rendering function
+        """
+        return self._source
+
+    def __init__(self, source: str, code=None):
+        """Init
+        """
+        self._source = source
+        self._code = code if code is not None else compile(source, '<htmler>', 'exec')
+
+        namespace = {'_escape': escape_html, '_value': _render_value, '_missing': _MISSING, 'Indent': Indent}
+        exec(self._code, namespace)
+        self._render = namespace['render']
+
+    def __call__(self, **values) -> str:
+        """Render the template
+        """
+        return self._render(values)
+
+    def save(self, path: str):
+        """Save compiled code to a file
+        """
+        with open(path, 'wb') as f:
+            f.write(MAGIC_NUMBER)
+            marshal.dump((self._source, self._code), f)
+
+    @classmethod
+    def load(cls, path: str):
+        """Load compiled code from a file
+
+        Files are compatible only with the Python version they were saved by.
+        """
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC_NUMBER)) != MAGIC_NUMBER:
+                raise ValueError(f'{path} was saved by another Python version')
+            source, code = marshal.load(f)
+
+        return cls(source, code)
+
+
+class _CodeGenerator:
+    """Generator of a template's rendering function
+    """
+
+    def __init__(self, indent: Union[bool, Indent]):
+        """Init
+        """
+        indent = _indent_mode(indent)
+        self._indent = DEFAULT_INDENT if indent is True else indent
+        self._lines = ['def render(values):', '    out = []', '    append = out.append']
+        self._level = 1
+        self._literal = []
+        self._vars = 0
+
+    def _write(self, s: str):
+        """Write a string to the output
+        """
+        if s:
+            self._literal.append(s)
+
+    def _flush(self):
+        """Write pending strings to the output as a single literal
+        """
+        if self._literal:
+            self._lines.append('    ' * self._level + f'append({"".join(self._literal)!r})')
+            self._literal = []
+
+    def _line(self, code: str):
+        """Add a line of code
+        """
+        self._flush()
+        self._lines.append('    ' * self._level + code)
+
+    def _var(self, prefix: str) -> str:
+        """Get a name for a new variable
+        """
+        self._vars += 1
+
+        return f'{prefix}_{self._vars}'
+
+    def source(self, node: Node, depth: int) -> str:
+        """Generate source code of the rendering function for a tree
+        """
+        self._node(node, depth, 'values')
+        self._line("return ''.join(out)")
+
+        return linesep.join(self._lines) + linesep
+
+    def _node(self, node: Node, depth: int, scope: str):
+        """Generate code rendering a node
+        """
+        indent = self._indent
+        cls = type(node)
+
+        if isinstance(node, Placeholder):
+            default = node.render_value(node.default, indent, depth)
+            str_value = '_escape(v)' if node._escape else 'v'
+            self._line(f'v = {scope}.get({node.key!r}, _missing)')
+            self._line(f'append({default!r} if v is _missing else {str_value} if v.__class__ is str '
+                       f'else _value(v, {node._escape}, {indent!r}, {depth}))')
+
+        elif isinstance(node, Loop):
+            self._children((node,), depth, scope)
+
+        elif isinstance(node, Element) and cls._expand is Element._expand \
+                and cls._expand_children in (Element._expand_children, BlockElement._expand_children):
+            self._write(node._render_open_tag(indent, depth))
+            if not isinstance(node, BlockElement):
+                self._children(node.children, depth, scope)
+            elif indent:
+                self._layout(node.children, depth + 1, scope, _LAYOUT_NONE, True)
+            else:
+                self._children(node.children, depth + 1, scope)
+            self._write(node._render_close_tag(indent, depth))
+
+        else:
+            self._write(''.join(render_fragments(node, indent, depth)))
+
+    def _children(self, children: Iterable[Node], depth: int, scope: str):
+        """Generate code rendering child nodes without layout
+        """
+        for node in children:
+            if isinstance(node, Loop):
+                item = self._var('item')
+                self._line(f'for {item} in {scope}.get({node.key!r}, ()):')
+                self._level += 1
+                n_lines = len(self._lines)
+                self._children(node.body, depth, item)
+                self._flush()
+                if len(self._lines) == n_lines:
+                    self._line('pass')
+                self._level -= 1
+            elif node._lazy:
+                self._children(node._iter_children(), depth, scope)
+            else:
+                self._node(node, depth, scope)
+
+    def _boundary(self, prev: Union[int, str], kind: int, depth: int):
+        """Generate code rendering whitespace between two nodes in block layout
+        """
+        table = self._indent._boundaries[depth][kind]
+        if not any(table):
+            return
+
+        # Previous node is known only while rendering
+        if isinstance(prev, str):
+            self._line(f'append({table!r}[{prev}])')
+        else:
+            self._write(table[prev])
+
+    def _layout(self, children: Iterable[Node], depth: int, scope: str, prev: Union[int, str], end: bool = False) \
+            -> Union[int, str]:
+        """Generate code rendering child nodes of a block element with indentation
+
+        Mirrors `BlockElement._iter_layout()`. The kind of the previous node is either a constant or the name of a
+        variable, if it depends on the number of loop iterations. The kind of the last node is returned.
+        """
+        for node in children:
+            if isinstance(node, Loop):
+                prev_var = self._var('prev')
+                item = self._var('item')
+                self._line(f'{prev_var} = {prev}')
+                self._line(f'for {item} in {scope}.get({node.key!r}, ()):')
+                self._level += 1
+                last = self._layout(node.body, depth, item, prev_var)
+                self._line(f'{prev_var} = {last}')
+                self._level -= 1
+                prev = prev_var
+                continue
+
+            if node._lazy:
+                prev = self._layout(node._iter_children(), depth, scope, prev)
+                continue
+
+            kind = node._layout
+            if kind == _LAYOUT_STATIC:
+                kind = node.node._layout
+            if kind > _LAYOUT_OTHER:
+                kind = _LAYOUT_OTHER
+
+            self._boundary(prev, kind, depth)
+            self._node(node, depth, scope)
+            prev = kind
+
+        if end:
+            self._boundary(prev, _LAYOUT_NONE, depth)
+
+        return prev
+
+
+def generate_source(node: Node, indent: Union[bool, Indent] = True, depth: int = 0) -> str:
+    """Generate source code of a function rendering a tree containing placeholders and loops
+
+    The module defines `render(values)` function, which expects `_escape`, `_value`, `_missing` and `Indent` globals,
+    see `CodeTemplate`.
+    """
+    return _CodeGenerator(indent).source(node, depth)
+
+
+def compile_code(node: Node, indent: Union[bool, Indent] = True, depth: int = 0) -> CodeTemplate:
+    """Compile a tree containing placeholders and loops into a code template
+
+    Output is the same as of the equivalent tree, which has every loop replaced with its body repeated for each item.
+    Like with `compile_template()`, lazily produced children are consumed once.
+    """
+    return CodeTemplate(generate_source(node, indent, depth))
@@ -1,6 +1,6 @@
 """setup.py
 """
-from setuptools import setup, find_packages
+from setuptools import setup, find_packages, Extension
 
 with open('README.md') as fh:
     long_description = fh.read()
@@ -16,6 +16,10 @@ setup(
     url='https://github.com/ashep/htmler',
     download_url='https://github.com/ashep/htmler/archive/master.zip',
     packages=find_packages(),
+    ext_modules=[
+        # Optional, the pure Python implementation is used if the extension cannot be built
+        Extension('htmler._speedups', ['htmler/_speedups.c'], optional=True),
+    ],
     install_requires=[],
     setup_requires=['pytest-runner'],
     tests_require=['pytest', 'pytest-cov'],
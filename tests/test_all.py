@@ -4,7 +4,7 @@ __author__ = 'Oleksandr Shepetko'
 __email__ = 'a@shepetko.com'
 __license__ = 'MIT'
 
-import pytest, random, string, htmler
+import io, os, sys, html, asyncio, pickle, pytest, random, string, subprocess, tracemalloc, htmler
 from os import linesep
 from random import randint as random_int
 from typing import Union, List, Type, Tuple
@@ -36,6 +36,25 @@ def _get_elements_classes(subcls_only: Union[Type, Tuple[Type, ...]] = None,
     return r
 
 
+def _build_document() -> htmler.Html:
+    """Build a document which uses most of the layout cases
+    """
+    return htmler.Html(
+        htmler.Head(
+            htmler.Meta(charset='utf-8'),
+            htmler.Title('Hello World Document'),
+            htmler.Comment('comment'),
+        ),
+        htmler.Body(
+            htmler.P('Text ', htmler.A('link', href='/a?b=1&c=2'), ' more text', htmler.Div('block')),
+            htmler.Ul(*(htmler.Li(htmler.Span(str(i)), css='item') for i in range(20))),
+            htmler.TagLessElement(htmler.Div('tagless'), 'text'),
+            htmler.Table(htmler.Tbody(*(htmler.Tr(htmler.Td(str(i)), htmler.Td(htmler.B('x'))) for i in range(20)))),
+        ),
+        lang='en',
+    )
+
+
 class TestElements:
     """Test Elements
     """
@@ -249,3 +268,1026 @@ class TestElements:
             expected = f'<{em.name}>{linesep}{(htmler.INDENT_WIDTH * " ")}{s}{linesep}</{em.name}>{linesep}'
 
             assert em.render() == expected
+
+    def test_iter_render(self):
+        """Test of rendering the node chunk by chunk
+        """
+        doc = _build_document()
+
+        for indent in True, False:
+            expected = doc.render(indent=indent)
+            assert ''.join(doc.iter_render(indent=indent)) == expected
+            assert str(doc) == doc.render()
+
+            chunks = list(doc.iter_render(chunk_size=64, indent=indent))
+            assert ''.join(chunks) == expected
+            assert len(chunks) > 1
+            assert all(len(c) >= 64 for c in chunks[:-1])
+
+        for cls in _get_elements_classes():
+            em = cls()
+            assert ''.join(em.iter_render()) == em.render()
+
+        assert list(htmler.Text('abc').iter_render()) == ['abc']
+        assert list(htmler.Comment('abc').iter_render()) == ['<!-- abc -->']
+
+    def test_render_to(self):
+        """Test of rendering into writable objects
+        """
+        doc = _build_document()
+
+        for indent in True, False:
+            expected = doc.render(indent=indent)
+
+            f = io.StringIO()
+            assert doc.render_to(f, buffer_size=64, indent=indent) == len(expected)
+            assert f.getvalue() == expected
+
+            f = io.BytesIO()
+            assert doc.render_to(f, 'utf-16', 64, indent=indent) == len(expected.encode('utf-16'))
+            assert f.getvalue() == expected.encode('utf-16')
+
+        # Writers which are not io streams
+        import tempfile
+        expected = doc.render()
+        with tempfile.SpooledTemporaryFile(mode='w+') as f:
+            assert doc.render_to(f) == len(expected)
+            f.seek(0)
+            assert f.read() == expected
+        with tempfile.SpooledTemporaryFile() as f:
+            assert doc.render_to(f) == len(expected.encode())
+
+        class Writer:
+            def __init__(self):
+                self.chunks = []
+
+            def write(self, s):
+                self.chunks.append(s)
+
+        w = Writer()
+        doc.render_to(w, binary=False)
+        assert ''.join(w.chunks) == expected
+        w = Writer()
+        doc.render_to(w)
+        assert b''.join(w.chunks) == expected.encode()
+        w.encoding = 'utf-8'
+        w.chunks = []
+        doc.render_to(w)
+        assert ''.join(w.chunks) == expected
+
+    def test_render_bytes(self):
+        """Test of rendering into bytes
+        """
+        doc = _build_document()
+        doc.append_child(htmler.P('Ünïcödé ✓'))
+
+        for indent in True, False:
+            expected = doc.render(indent=indent)
+
+            r = doc.render_bytes(indent=indent)
+            assert isinstance(r, bytearray) and r == expected.encode()
+            assert doc.render_bytes('utf-16', 64, indent=indent) == expected.encode('utf-16')
+            assert doc.render_bytes(indent=indent, memoize=True) == expected.encode()
+
+    def test_render_deep(self):
+        """Test of rendering of trees deeper than the recursion limit
+        """
+        depth = sys.getrecursionlimit() * 2
+        em = htmler.Span('x')
+        for _ in range(depth):
+            em = htmler.Div(em)
+
+        s = em.render(indent=False)
+        assert s == '<div>' * depth + '<span>x</span>' + '</div>' * depth
+        assert len(em.render()) > len(s)
+
+    def test_static(self):
+        """Test of frozen nodes
+        """
+        for cls in _get_elements_classes():
+            child = cls()
+            for parent_cls in htmler.Div, htmler.Span, htmler.TagLessElement:
+                for children in (child,), ('text', child), (child, 'text'), ('text', child, htmler.Div()):
+                    expected = parent_cls(*children)
+                    frozen = parent_cls(*(c.freeze() if c is child else c for c in children))
+                    for indent in True, False:
+                        assert frozen.render(indent=indent) == expected.render(indent=indent)
+
+        doc = _build_document()
+        assert htmler.Div(doc.freeze()).render() == htmler.Div(doc).render()
+
+        # Rendered output is reused until invalidated
+        text = htmler.Text('a')
+        static = htmler.Static(htmler.Div(text))
+        assert static.freeze() is static
+        assert htmler.Static(static).node is static.node
+        assert static.render() == htmler.Div('a').render()
+        text._content = 'b'
+        assert static.render() == htmler.Div('a').render()
+        assert static.invalidate().render() == htmler.Div('b').render()
+
+        with pytest.raises(ValueError):
+            static.append_child(htmler.Div())
+
+        with pytest.raises(TypeError):
+            htmler.Static('text')
+
+    def test_memoize(self):
+        """Test of memoized rendering
+        """
+        text = htmler.Text('text')
+        td = htmler.Td(text)
+        sibling = htmler.Tr(htmler.Td('sibling'))
+        doc = _build_document()
+        doc.append_child(htmler.Table(htmler.Tr(td), sibling))
+        assert td.parent.parent.parent is doc and text.parent is td
+
+        def check():
+            for indent in True, False:
+                assert doc.render(indent=indent, memoize=True) == doc.render(indent=indent)
+                assert doc.render(indent=indent, memoize=True) == doc.render(indent=indent)
+                assert ''.join(doc.iter_render(indent=indent, memoize=True)) == doc.render(indent=indent)
+
+        check()
+        assert (True, 2) in sibling._cache and (False, 2) in sibling._cache
+
+        text.content = 'changed'
+        assert doc._cache is None and sibling._cache is not None
+        check()
+        assert 'changed' in doc.render(memoize=True)
+
+        td.set_attr('id', 'cell')
+        check()
+        td.add_css('a')
+        check()
+        td.toggle_css('a')
+        check()
+        td.append_child(htmler.B('bold'))
+        check()
+
+        frozen_text = htmler.Text('static')
+        static = htmler.Static(htmler.Div(frozen_text))
+        doc.append_child(static)
+        check()
+        frozen_text.content = 'frozen'
+        assert 'frozen' not in doc.render(memoize=True)
+        static.invalidate()
+        assert 'frozen' in doc.render(memoize=True)
+
+    def test_escape_html(self):
+        """Test of HTML escaping
+        """
+        impls = {htmler.base.escape_html, htmler.base._escape_html_py}
+        alphabet = '&<>"\'abc éЖ中\U0001f600'
+
+        for f in impls:
+            assert f('') == ''
+            assert f('abc') == 'abc'
+            assert f('<a href="x">it\'s & more</a>') == '&lt;a href=&quot;x&quot;&gt;it&#x27;s &amp; more&lt;/a&gt;'
+            assert f('Ж<\U0001f600>') == 'Ж&lt;\U0001f600&gt;'
+
+            for _ in range(200):
+                s = ''.join(random.choice(alphabet) for _ in range(random_int(0, 50)))
+                assert f(s) == html.escape(s)
+
+        assert htmler.Text('<\'>', True).render() == '&lt;&#x27;&gt;'
+        assert htmler.html_attrs_str({'title': 'it\'s "quoted"'}) == ' title="it&#x27;s &quot;quoted&quot;"'
+
+    def test_attrs_str_cache(self):
+        """Test of caching of formatted attributes
+        """
+        td_1 = htmler.Td(css='num', data={'x': 'y'})
+        td_2 = htmler.Td(css='num', data={'x': 'y'})
+        assert td_1.render(indent=False) == td_2.render(indent=False) == '<td data-x="y" class="num"></td>'
+        assert td_1._attrs_str is td_2._attrs_str
+
+        td_1.set_attr('css', 'str')
+        assert td_1.render(indent=False) == '<td data-x="y" class="str"></td>'
+        assert td_2.render(indent=False) == '<td data-x="y" class="num"></td>'
+
+        assert htmler.Input(value=1).render() == '<input value="1">'
+        assert htmler.Input(value=True).render() == '<input value="True">'
+        assert htmler.Input(checked=1).render() == '<input checked>'
+        assert htmler.Input(checked='').render() == '<input>'
+
+        for i in range(htmler.base.ATTRS_STR_CACHE_SIZE + 1):
+            htmler.html_attrs_str_cached({'id': str(i)})
+        assert len(htmler.base._attrs_str_cache) <= htmler.base.ATTRS_STR_CACHE_SIZE
+
+    def test_memory(self):
+        """Test of memory used by nodes
+
+        Before nodes got `__slots__`, an empty element used about 350 bytes and a text node about 210 bytes.
+        """
+        n = 10000
+        content = random_str()
+
+        for factory, limit in (htmler.Td, 160), (htmler.Br, 160), (lambda: htmler.Text(content), 64):
+            tracemalloc.start()
+            nodes = [factory() for _ in range(n)]
+            size = tracemalloc.get_traced_memory()[0] - sys.getsizeof(nodes)
+            tracemalloc.stop()
+
+            print(f'{type(nodes[0]).__name__}: {size / n:.1f} bytes per node')
+            assert size / n <= limit
+
+        assert not hasattr(htmler.Td(), '__dict__')
+        assert not hasattr(htmler.Text(), '__dict__')
+        assert htmler.Td._name == htmler.Td().name == 'td'
+
+    def test_extend(self):
+        """Test of bulk appending of children
+        """
+        for cls in _get_elements_classes(except_subcls=htmler.SingleTagElement):
+            child_id = random_str()
+            children = [htmler.Span('a'), 'b', htmler.Div(id=child_id)]
+
+            em = cls()
+            assert em.extend(children) is em
+            assert all(child.parent is em for child in em)
+            assert em.render() == cls(*children).render()
+            assert em.get_element_by_id(child_id) is children[2]
+
+            # Generators are accepted by constructors
+            assert cls(c for c in children).render() == em.render()
+            assert cls('x', (c for c in children), 'y').render() == cls('x', *children, 'y').render()
+
+            with pytest.raises(TypeError):
+                em.extend([htmler.Span(), 1])
+            assert len(em) == 3
+
+        for cls in _get_elements_classes(htmler.SingleTagElement):
+            with pytest.raises(ValueError):
+                cls().extend([htmler.Span()])
+
+    def test_extend_lazy(self):
+        """Test of lazily consumed children
+        """
+        consumed = []
+
+        def rows(n: int):
+            for i in range(n):
+                consumed.append(i)
+                yield htmler.Tr(htmler.Td(str(i)), htmler.Td(htmler.B('x'), 'text'))
+            yield 'text'
+            yield htmler.LazyChildren(htmler.Span(str(i)) for i in range(3))
+
+        for parent_cls in htmler.Tbody, htmler.Span, htmler.TagLessElement:
+            for indent in True, False:
+                for before, after in ((), ()), (('a', htmler.Div()), (htmler.B(), 'b')):
+                    expected = parent_cls(*before, *rows(10), *after).render(indent=indent)
+                    consumed.clear()
+
+                    em = parent_cls(*before).extend(rows(10), lazy=True).extend(after)
+                    assert not consumed
+                    assert htmler.Div(em).render(indent=indent) == \
+                        htmler.Div(parent_cls(*before, *rows(10), *after)).render(indent=indent)
+                    assert em.render(indent=indent) == parent_cls(*before, *after).render(indent=indent)
+
+                    em = parent_cls(*before).extend(rows(10), lazy=True).extend(after)
+                    assert ''.join(em.iter_render(indent=indent, chunk_size=16)) == expected
+
+                    em = parent_cls(*before).extend(rows(10), lazy=True).extend(after)
+                    assert em.render(indent=indent, memoize=True) == expected
+                    assert em._cache is None
+
+        with pytest.raises(TypeError):
+            htmler.Div().extend([1], lazy=True).render()
+
+    def test_lazy_children(self):
+        """Test of lazy child sources
+        """
+        def rows(n: int = 10):
+            return (htmler.Tr(htmler.Td(str(i)), htmler.Td('x')) for i in range(n))
+
+        expected = htmler.Tbody(*rows()).render()
+
+        # Callables are called on every rendering
+        em = htmler.Tbody(htmler.LazyChildren(rows))
+        assert em.render() == em.render() == expected
+        assert htmler.Tbody(rows).render() == htmler.Tbody().extend([rows]).render() == expected
+        em = htmler.Tbody(rows)
+        assert len(em) == 1 and isinstance(next(iter(em)), htmler.LazyChildren) and next(iter(em)).source is rows
+        assert htmler.Div(lambda: 'text').render() == htmler.Div('text').render()
+        assert htmler.Div(lambda: htmler.B()).render() == htmler.Div(htmler.B()).render()
+
+        # Iterators are consumed once
+        em = htmler.Tbody(htmler.LazyChildren(rows()))
+        assert em.render() == expected
+        assert em.render() == htmler.Tbody().render()
+
+        # Produced nodes are not kept while rendering
+        n = 5000
+        with open(os.devnull, 'wb') as f:
+            tracemalloc.start()
+            htmler.Table(htmler.Tbody(lambda: rows(n))).render_to(f, buffer_size=1024)
+            em_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        tracemalloc.start()
+        em = htmler.Table(htmler.Tbody(rows(n)))
+        tree_size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        assert em_peak < tree_size / 10
+
+    def test_get_element_by_id_index(self):
+        """Test of maintaining of the ID index
+        """
+        doc = _build_document()
+        body = next(c for c in doc if isinstance(c, htmler.Body))
+        form = body.append_child(htmler.Form())
+        fieldset = form.append_child(htmler.Fieldset(htmler.Div(htmler.Input(id='name'), id='row')))
+        inp = fieldset.get_element_by_id('name')
+
+        for ancestor in doc, body, form, fieldset:
+            assert ancestor.get_element_by_id('name') is inp
+            assert ancestor.get_element_by_id('row') is inp.parent
+            assert ancestor.get_element_by_id('missing') is None
+
+        # ID set after insertion
+        select = htmler.Select()
+        fieldset.append_child(htmler.Div(select))
+        select.set_attr('id', 'select')
+        assert doc.get_element_by_id('select') is select
+
+        # ID changed
+        inp.set_attr('id', 'title')
+        assert doc.get_element_by_id('name') is None
+        assert doc.get_element_by_id('title') is inp and form.get_element_by_id('title') is inp
+
+        # Removed subtree
+        assert fieldset.remove_child(inp.parent) is inp.parent and inp.parent.parent is None
+        assert doc.get_element_by_id('title') is None and doc.get_element_by_id('row') is None
+        assert inp.parent.get_element_by_id('title') is inp
+        assert doc.get_element_by_id('select') is select
+
+        # Bulk appending
+        fieldset.extend([htmler.Div(htmler.Span(id='bulk_1')), htmler.Span(id='bulk_2')])
+        assert doc.get_element_by_id('bulk_1').name == 'span' and doc.get_element_by_id('bulk_2').name == 'span'
+
+        with pytest.raises(ValueError):
+            fieldset.remove_child(inp)
+
+        with pytest.raises(ValueError):
+            htmler.Text().remove_child(htmler.Text())
+
+        # Children with IDs passed to the constructor
+        span = htmler.Span(id='span')
+        assert htmler.Div(htmler.P(span)).get_element_by_id('span') is span
+
+        # Elements with the same ID take place of each other when removed or renamed
+        x1, x2, x3 = htmler.Div(id='d'), htmler.Div(id='d'), htmler.Span(id='d')
+        doc = htmler.Body(htmler.Section(x1), x2, htmler.P(x3))
+        doc.remove_child(x2)
+        assert doc.get_element_by_id('d') in (x1, x3)
+        x1.set_attr('id', 'e')
+        assert doc.get_element_by_id('d') is x3 and doc.get_element_by_id('e') is x1
+        doc.remove_child(x3.parent)
+        assert doc.get_element_by_id('d') is None
+
+        # ...including ones removed together, while elements with unique IDs are indexed as before
+        x1, x2, x3 = htmler.Div(id='d'), htmler.Div(id='d'), htmler.Span(id='d')
+        section = htmler.Section(x1, x2, htmler.P(id='p'))
+        doc = htmler.Body(section, x3)
+        assert doc.get_element_by_id('d') in (x1, x2, x3) and section.get_element_by_id('d') in (x1, x2)
+        assert doc.get_element_by_id('p') is section.get_element_by_id('p')
+        doc.remove_child(section)
+        assert doc.get_element_by_id('d') is x3 and doc.get_element_by_id('p') is None
+        section.remove_child(x1)
+        assert section.get_element_by_id('d') is x2
+        assert htmler.loads(htmler.dumps(htmler.Div(x2, x3))).get_element_by_id('d').name == 'div'
+
+    def test_select(self):
+        """Test of CSS selectors
+        """
+        doc = _build_document()
+        nav = htmler.Nav(
+            htmler.Ul(
+                htmler.Li(htmler.A('Home', href='/', css='active link'), id='home'),
+                htmler.Li(htmler.A('Docs', href='/docs.pdf', css='link-external', lang='en-US')),
+            ),
+            htmler.Input(type='checkbox', checked=True),
+            htmler.Input(type='checkbox', checked=False, label_for='x'),
+        )
+        body = next(c for c in doc if isinstance(c, htmler.Body))
+        body.append_child(nav)
+
+        def names(selector):
+            return [em.render(indent=False) if em.name == 'a' else em.name for em in doc.select(selector)]
+
+        assert len(doc.select('li')) == 22
+        assert len(doc.select('li.item')) == 20
+        assert len(doc.select('ul > li > span')) == 20
+        assert len(doc.select('ul span')) == 20
+        assert len(doc.select('ul>span')) == 0
+        assert len(doc.select('td b')) == 20
+        assert len(doc.select('*')) == len(doc.select('html *')) == len(doc.select('body *')) + 4
+        assert names('nav a') == [
+            '<a href="/" class="active link">Home</a>',
+            '<a href="/docs.pdf" class="link-external" lang="en-US">Docs</a>',
+        ]
+        assert names('nav a.link') == ['<a href="/" class="active link">Home</a>']
+        assert names('.link.active') == names('a[class~=link]') == names('#home a') == names('a[href="/"]')
+        assert names('a[href$=".pdf"]') == names("a[href^='/d']") == names('a[href*=docs]') == names('a[lang|=en]')
+        assert names('a[lang|=US]') == names('a[href=docs]') == names('#missing') == names('.link-missing') == []
+        assert names('title, nav, head') == ['head', 'title', 'nav']
+        assert names('li#home, nav li') == ['li', 'li']
+        assert names('input[checked]') == names('input[for=x]') == ['input']
+        assert names('meta[charset=utf-8]') == ['meta']
+
+        assert doc.select_one('td').render(indent=False) == '<td>0</td>'
+        assert doc.select_one('td, th').render(indent=False) == '<td>0</td>'
+        assert doc.select_one('video') is None
+
+        # Index is reused until the tree changes
+        index = htmler.select.get_index(doc)
+        assert doc.select('nav a') and htmler.select.get_index(doc) is index
+        nav.append_child(htmler.A('New', css='link'))
+        assert htmler.select.get_index(doc) is not index
+        assert len(doc.select('nav .link')) == 2
+
+        for invalid in '', 'a >', '> a', 'a,', 'a b!', 'a[href', 'div span.', 'a*':
+            with pytest.raises(ValueError):
+                doc.select(invalid)
+
+    def test_css_classes(self):
+        """Test of CSS classes handling
+        """
+        em = htmler.Div(css='btn btn-primary  btn')
+        assert em.get_attr('css') == 'btn btn-primary' and em.attrs == {'css': 'btn btn-primary'}
+        assert em.has_css('btn') and em.has_css('btn-primary') and not em.has_css('primary')
+        assert em.css_classes == ('btn', 'btn-primary')
+
+        em.remove_css('btn')
+        assert em.render(indent=False) == '<div class="btn-primary"></div>'
+        assert not em.has_css('btn')
+
+        em.add_css('a', 'b c', 'btn-primary')
+        assert em.render(indent=False) == '<div class="btn-primary a b c"></div>'
+        em.remove_css('a', 'c', 'missing')
+        assert em.render(indent=False) == '<div class="btn-primary b"></div>'
+        em.toggle_css('b')
+        em.toggle_css('d')
+        assert em.render(indent=False) == '<div class="btn-primary d"></div>'
+
+        assert htmler.Div(css=['a', 'b']).get_attr('css') == 'a b'
+        assert htmler.Div(css=1).get_attr('css') == '1'
+        assert htmler.Div().add_css('a').render(indent=False) == '<div class="a"></div>'
+        assert htmler.Div().remove_css('a').render(indent=False) == '<div></div>'
+        assert not htmler.Div().has_css('a') and not htmler.Div(css=None).has_css('a')
+        assert htmler.Div().css_classes == ()
+
+        # Classes are changed only by methods of elements, which update rendered output and indexes
+        em = htmler.Div(htmler.Span(css='a'))
+        span = em.select_one('.a')
+        em.render()
+        assert not hasattr(span.css_classes, 'add')
+        span.add_css('b')
+        assert span.render(indent=False) == '<span class="a b"></span>' and em.select_one('.b') is span
+
+        # Classes are not shared between elements
+        em_1 = htmler.Td(css='num')
+        em_2 = htmler.Td(css=em_1.css_classes)
+        em_2.add_css('total')
+        assert em_1.render(indent=False) == '<td class="num"></td>'
+        assert em_2.render(indent=False) == '<td class="num total"></td>'
+
+        # Changes are seen by memoized rendering and selectors
+        doc = htmler.Div(htmler.Span(em_1))
+        assert doc.render(memoize=True) == doc.render() and len(doc.select('.num')) == 1
+        em_1.add_css('x')
+        assert doc.render(memoize=True) == doc.render() and len(doc.select('.x')) == 1
+        em_1.remove_css('x')
+        assert doc.render(memoize=True) == doc.render() and len(doc.select('.x')) == 0
+
+    def test_template(self):
+        """Test of template compilation
+        """
+        def build(title, content) -> htmler.Html:
+            return htmler.Html(htmler.Body(htmler.H1(title), htmler.Div(htmler.P('Text'), content, css='content')))
+
+        tree = build(htmler.Placeholder('title'), htmler.Placeholder('content', default='-'))
+        for indent in True, False:
+            tpl = htmler.compile_template(tree, indent=indent)
+            assert tpl.keys == ('title', 'content')
+
+            # Values are escaped, inline nodes are rendered
+            assert tpl(title='<T>', content='a & b') == \
+                build(htmler.Text('<T>', True), 'a &amp; b').render(indent=indent)
+            content = htmler.Span(htmler.B('x'), css='y')
+            assert tpl(title=1, content=content) == build('1', content).render(indent=indent)
+
+            # Missing values are replaced with defaults
+            assert tpl() == tree.render(indent=indent) == build('', '-').render(indent=indent)
+
+        assert htmler.compile_template(htmler.Placeholder('x', escape=False))(x='<b>') == '<b>'
+        assert issubclass(htmler.Template, htmler.BlockElement)
+        assert htmler.compile_template(htmler.Div('a', htmler.Placeholder('x')), depth=1)(x='b') == \
+            htmler.Div('a', 'b').render(depth=1)
+
+    def test_code_template(self, tmp_path):
+        """Test of templates compiled to Python code
+        """
+        def build(user, rows, items) -> htmler.Html:
+            return htmler.Html(htmler.Body(htmler.Div(
+                'Hello', user,
+                htmler.Table(htmler.Tbody(*rows)),
+                'Items', htmler.Ul(*items),
+                htmler.Comment('end'),
+            )))
+
+        def row(name, price) -> htmler.Tr:
+            return htmler.Tr(htmler.Td(name), htmler.Td(price, css='num'))
+
+        tree = build(
+            htmler.Placeholder('user', default='guest'),
+            [htmler.Loop('rows', row(htmler.Placeholder('name'), htmler.Placeholder('price')))],
+            [htmler.Loop('items', htmler.Li(htmler.Placeholder('x')), 'text', htmler.B(htmler.Placeholder('x')))],
+        )
+
+        for indent in True, False:
+            tpl = htmler.compile_code(tree, indent=indent)
+            for rows, items in ([], []), ([{'name': 'a<b', 'price': 1}, {'name': 'c'}], [{'x': '<1>'}, {'x': 2}]):
+                expected = build(
+                    htmler.Text('U&', True),
+                    [row(htmler.Text(r['name'], True), str(r.get('price', ''))) for r in rows],
+                    [n for i in items for n in (htmler.Li(htmler.Text(str(i['x']), True)), 'text', htmler.B(
+                        htmler.Text(str(i['x']), True)))],
+                )
+                assert tpl(user='U&', rows=rows, items=items) == expected.render(indent=indent)
+
+            # Loops give nothing outside of code templates
+            assert tpl() == tree.render(indent=indent)
+            assert tpl(user=htmler.I('x')) == htmler.compile_template(tree, indent=indent)(user=htmler.I('x'))
+
+        # Compiled code is saved and loaded
+        path = str(tmp_path / 'tpl.bin')
+        tpl.save(path)
+        loaded = htmler.CodeTemplate.load(path)
+        assert loaded.source == tpl.source and loaded(rows=[{'name': 'x'}]) == tpl(rows=[{'name': 'x'}])
+
+        with open(path, 'r+b') as f:
+            f.write(b'\0\0')
+        with pytest.raises(ValueError):
+            htmler.CodeTemplate.load(path)
+
+    def test_pickle(self):
+        """Test of pickling
+        """
+        doc = _build_document()
+        em = list(doc)[-1]
+        assert pickle.loads(pickle.dumps(doc)).render() == doc.render()
+
+        # Subtree is pickled without its parent
+        em_copy = pickle.loads(pickle.dumps(em))
+        assert em_copy.parent is None and em_copy.render() == em.render()
+        assert all(child.parent is em_copy for child in em_copy)
+        assert len(pickle.dumps(em)) < len(pickle.dumps(doc))
+
+        # Shallow copies share children, which keep their parent
+        from copy import copy
+        em_copy = copy(em)
+        assert em_copy.parent is None and em_copy.render() == em.render()
+        assert all(child.parent is em for child in em_copy)
+
+    def test_parallel(self):
+        """Test of parallel rendering
+        """
+        def section(i: int) -> htmler.Section:
+            return htmler.Section(htmler.H2(f'Section {i}'), htmler.P('Intro ', htmler.B('bold')), htmler.Table(
+                htmler.Tbody(*(htmler.Tr(htmler.Td(f'{i}-{j}', css='c'), htmler.Td('x')) for j in range(500)))))
+
+        doc = htmler.Html(htmler.Body(htmler.Div(
+            'Text', *(section(i) for i in range(8)), htmler.Span('inline'), section(8), section(9),
+            htmler.Div(lambda: [section(10)]),
+        )))
+
+        with htmler.ParallelRenderer(2, threshold=0) as renderer:
+            for indent in True, False:
+                expected = doc.render(indent=indent)
+                assert renderer.render(doc, indent) == expected
+                assert doc.render(indent=indent, depth=2, parallel=renderer) == doc.render(indent=indent, depth=2)
+
+        assert doc.render(parallel=2) == doc.render()
+        with pytest.raises(ValueError):
+            doc.render(parallel=2, memoize=True)
+
+        # Parallel rendering leaves the tree intact
+        doc = htmler.Html(htmler.Body(*(section(i) for i in range(4))))
+        body = list(doc)[0]
+        with htmler.ParallelRenderer(2, threshold=0) as renderer:
+            assert doc.render(memoize=True) == doc.render(parallel=renderer)
+        nodes = [doc]
+        while nodes:
+            node = nodes.pop()
+            assert all(child.parent is node for child in node)
+            nodes.extend(node)
+        list(body)[0].set_attr('id', 'first')
+        assert doc.get_element_by_id('first') is list(body)[0]
+        assert doc.render(memoize=True) == doc.render() and 'id="first"' in doc.render()
+        assert len(doc.select('html section')) == 4
+
+        # Subtrees appended to several parents are rendered at every place once, and placeholders outside of batches
+        # are rendered as text
+        shared = section(11)
+        doc = htmler.Body(section(12), shared, htmler.Div(section(13), shared), shared, htmler.Placeholder('x'))
+        with htmler.ParallelRenderer(2, threshold=100) as renderer:
+            for indent in True, False:
+                assert renderer.render(doc, indent) == doc.render(indent=indent)
+
+    def test_async(self):
+        """Test of asynchronous rendering
+        """
+        async def rows(n: int):
+            for i in range(n):
+                await asyncio.sleep(0)
+                yield htmler.Tr(htmler.Td(str(i)))
+
+        async def items():
+            await asyncio.sleep(0)
+            return [htmler.Li('a'), 'text', htmler.B('b')]
+
+        async def paragraph():
+            return htmler.P('single')
+
+        def build(a, b, c, d) -> htmler.Html:
+            return htmler.Html(htmler.Body(
+                htmler.Table(htmler.Tbody(a)), htmler.Ul(b), htmler.Div('x', c, htmler.Span(d)),
+            ))
+
+        async def main():
+            for indent in True, False:
+                doc = build(rows(3), items(), paragraph, rows(2))
+                expected = build(
+                    iter([htmler.Tr(htmler.Td(str(i))) for i in range(3)]),
+                    iter([htmler.Li('a'), 'text', htmler.B('b')]),
+                    htmler.P('single'),
+                    iter([htmler.Tr(htmler.Td(str(i))) for i in range(2)]),
+                ).render(indent=indent)
+                assert await doc.arender(indent=indent) == expected
+
+                # Async function is called on every rendering
+                assert await doc.arender(indent=indent) == build(
+                    iter(()), iter(()), htmler.P('single'), iter(())).render(indent=indent)
+
+            # Other tasks run while rendering
+            ticks = 0
+
+            async def tick():
+                nonlocal ticks
+                while True:
+                    ticks += 1
+                    await asyncio.sleep(0)
+
+            task = asyncio.ensure_future(tick())
+            doc = _build_document()
+            chunks = [chunk async for chunk in doc.aiter_render(64)]
+            task.cancel()
+            assert ''.join(chunks) == doc.render() and ticks >= len(chunks) - 1 > 1
+
+        asyncio.run(main())
+
+        with pytest.raises(TypeError):
+            htmler.Div(paragraph).render()
+        with pytest.raises(TypeError):
+            htmler.Span(paragraph).render(indent=False)
+
+        # Async children produced by lazy children, in any parents and without indentation
+        async def items():
+            yield htmler.B('b')
+            yield 'c'
+
+        def lazy():
+            return ['a', htmler.AsyncChildren(items), 'd']
+
+        for em, expected in ((htmler.Span(lazy), '<span>a<b>b</b>cd</span>'),
+                             (htmler.Div(lazy), '<div>a<b>b</b>cd</div>')):
+            assert asyncio.run(em.arender(indent=False)) == expected
+        expected = htmler.Span('a', htmler.B('b'), 'c', 'd')
+        assert asyncio.run(htmler.Div(htmler.Span(lazy)).arender()) == htmler.Div(expected).render()
+        assert asyncio.run(htmler.Div(lazy).arender()) == htmler.Div(*expected).render()
+        with pytest.raises(TypeError):
+            htmler.Span(lazy).render()
+
+        # Options which asynchronous rendering does not support are not ignored
+        for kwargs in {'minify': True}, {'profile': htmler.RenderProfile()}, {'memoize': True}, {'parallel': 2}:
+            with pytest.raises(ValueError):
+                asyncio.run(htmler.Div('a').arender(**kwargs))
+
+    def test_profile(self):
+        """Test of render profiling
+        """
+        doc = _build_document()
+        doc.append_child(htmler.Div(htmler.Div(htmler.Div('nested'))))
+
+        for indent in True, False:
+            profile = htmler.RenderProfile()
+            out = doc.render(indent=indent, profile=profile)
+            assert out == doc.render(indent=indent)
+
+            stats = profile.as_dict()
+            html_stats = stats['tags']['html']
+            assert html_stats['count'] == 1 and html_stats['chars'] == len(out)
+            assert sum(tag['self_chars'] for tag in stats['tags'].values()) == len(out)
+            assert stats['tags']['td']['count'] == 40 and stats['subtrees']['html;body;table;tbody;tr']['count'] == 20
+            assert 0 < html_stats['self_time'] < html_stats['total_time']
+
+            # Nested elements with the same name are counted once
+            div_stats = stats['tags']['div']
+            assert div_stats['count'] == 5 and div_stats['chars'] == sum(
+                s['chars'] for path, s in stats['subtrees'].items() if path.split(';').count('div') == 1 and
+                path.endswith('div'))
+
+            assert profile.collapsed('chars').splitlines()[0] == f"html {stats['subtrees']['html']['self_chars']}"
+            for line in profile.collapsed().splitlines():
+                path, value = line.rsplit(' ', 1)
+                assert path in stats['subtrees'] and int(value) > 0
+
+        with pytest.raises(ValueError):
+            htmler.RenderProfile().collapsed('size')
+        with pytest.raises(ValueError):
+            doc.render(profile=htmler.RenderProfile(), memoize=True)
+
+    def test_minify(self):
+        """Minified rendering
+        """
+        doc = htmler.Html(
+            htmler.Head(htmler.Title(' Title  \n'), htmler.Style('a  {\n  color: red;\n}')),
+            htmler.Body(
+                htmler.Ul(htmler.Li('one  \t two'), htmler.Li(htmler.B('three'), css='item last')),
+                htmler.Pre('  keep\n    spaces '),
+                htmler.P('text', htmler.A('link', href='/a?b=1', title='')),
+                htmler.P('last', htmler.Textarea('a\n  b'), htmler.Input(type='text', value="it's")),
+                htmler.Table(htmler.Tr(htmler.Td('1'), htmler.Th('2')), htmler.Tr(htmler.Td('3'))),
+                htmler.Select(htmler.Option('a', value='a'), htmler.Option('b', value='b b')),
+                htmler.TagLessElement(htmler.Li('x')),
+                htmler.Comment('note  '),
+                htmler.Dl(htmler.Dt('t'), htmler.Dd('d')),
+            ),
+            lang='en',
+        )
+
+        assert doc.render(minify=True) == (
+            '<!DOCTYPE html><html lang=en><head><title> Title </title><style>a  {\n  color: red;\n}</style><body>'
+            '<ul><li>one two<li class="item last"><b>three</b></ul>'
+            '<pre>  keep\n    spaces </pre>'
+            '<p>text<a href="/a?b=1" title="">link</a>'
+            '<p>last<textarea>a\n  b</textarea><input type=text value=it&#x27;s>'
+            '<table><tr><td>1<th>2<tr><td>3</table>'
+            '<select><option value=a>a<option value="b b">b</select>'
+            '<li>x</li>'
+            '<!-- note   -->'
+            '<dl><dt>t<dd>d</dl>'
+        )
+
+        # Closing tags of fragments and of last children of elements without tags are kept
+        assert htmler.Li('a  b').render(minify=True) == '<li>a b</li>'
+        assert htmler.Ul(htmler.TagLessElement(htmler.Li('a')), htmler.Li('b')).render(minify=True) == \
+            '<ul><li>a</li><li>b</ul>'
+
+        # Lazy children and frozen nodes are taken into account
+        ul = htmler.Ul(htmler.Li('a').freeze()).extend((htmler.Li(s) for s in 'bc'), lazy=True)
+        assert ul.render(minify=True) == '<ul><li>a<li>b<li>c</ul>'
+
+        # Async children can be rendered only asynchronously
+        async def produce():
+            yield htmler.Li('a')
+
+        with pytest.raises(TypeError):
+            htmler.Ul(htmler.AsyncChildren(produce)).render(minify=True)
+        with pytest.raises(TypeError):
+            htmler.Ul(htmler.LazyChildren([htmler.AsyncChildren(produce)])).render(minify=True)
+
+        with pytest.raises(ValueError):
+            doc.render(minify=True, memoize=True)
+        with pytest.raises(ValueError):
+            doc.render(minify=True, profile=htmler.RenderProfile())
+
+    def test_compressed(self):
+        """Compressed rendering
+        """
+        import bz2, gzip, lzma, zlib
+
+        doc = _build_document()
+        expected = doc.render().encode()
+        decompress = {
+            'gzip': gzip.decompress,
+            'zlib': zlib.decompress,
+            'deflate': lambda data: zlib.decompress(data, -zlib.MAX_WBITS),
+            'bz2': bz2.decompress,
+            'lzma': lzma.decompress,
+        }
+        for codec, f in decompress.items():
+            assert f(doc.render_compressed(codec)) == expected
+            assert f(doc.render_compressed(codec, 1, indent=False)) == doc.render(indent=False).encode()
+
+        span = htmler.Span('Привіт')
+        assert gzip.decompress(span.render_compressed(encoding='cp1251')) == '<span>Привіт</span>'.encode('cp1251')
+
+        # Flushed chunks are decompressed as they come
+        d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        rendered = doc.iter_render(64)
+        chunks = list(doc.iter_compressed(chunk_size=64, flush=True))
+        assert len(chunks) > 1
+        for chunk, text in zip(chunks, rendered):
+            assert d.decompress(chunk) == text.encode()
+
+        with pytest.raises(ValueError):
+            doc.iter_compressed('zip')
+        with pytest.raises(ValueError):
+            doc.iter_compressed('bz2', flush=True)
+
+    def test_indent_style(self):
+        """Rendering with indentation styles
+        """
+        doc = _build_document()
+        default = doc.render()
+
+        assert htmler.Indent() is htmler.DEFAULT_INDENT is htmler.Indent(htmler.INDENT_WIDTH, False, linesep)
+        assert pickle.loads(pickle.dumps(htmler.Indent(2, True))) is htmler.Indent(2, True)
+        assert doc.render(indent=htmler.DEFAULT_INDENT) == default
+
+        div = htmler.Div(htmler.P('text', htmler.B('bold')), htmler.Span('inline'))
+        assert div.render(indent=htmler.Indent(2, newline='\r\n')) == \
+            '<div>\r\n  <p>\r\n    text<b>bold</b>\r\n  </p>\r\n  <span>inline</span>\r\n</div>\r\n'
+        assert div.render(indent=htmler.Indent(tabs=True, newline='\n')) == \
+            '<div>\n\t<p>\n\t\ttext<b>bold</b>\n\t</p>\n\t<span>inline</span>\n</div>\n'
+        assert htmler.Html().render(indent=htmler.Indent(newline='\n')) == '<!DOCTYPE html>\n<html>\n</html>\n'
+
+        # Styles are applied by all renderers
+        indent = htmler.Indent(1, newline='\n')
+        expected = doc.render(indent=indent)
+        assert expected != default and expected.count('\n') == default.count(linesep)
+        assert doc.render(indent=indent, memoize=True) == expected
+        assert doc.render(indent=indent, profile=htmler.RenderProfile()) == expected
+        assert asyncio.run(doc.arender(indent=indent)) == expected
+        assert htmler.compile_template(doc, indent)() == expected
+        assert htmler.compile_code(doc, indent)() == expected
+        assert htmler.compile_code(htmler.Div(htmler.Placeholder('x')), indent)(x=htmler.B('y')) == \
+            '<div>\n <b>y</b>\n</div>\n'
+
+        # Values other than styles are taken as true or false
+        assert doc.render(indent=1) == doc.render(indent='yes', memoize=True) == default
+        assert doc.render(indent=0) == doc.render(indent=None, parallel=2) == doc.render(indent=False)
+        assert asyncio.run(doc.arender(indent=1)) == default
+        assert htmler.compile_template(doc, 1)() == htmler.compile_code(doc, 1)() == default
+
+        with pytest.raises(TypeError):
+            htmler.Indent('4')
+        with pytest.raises(ValueError):
+            htmler.Indent(-1)
+
+        # Width is read from the environment as a number
+        r = subprocess.run([sys.executable, '-c', 'import htmler; print(htmler.Div("x").render(), end="")'],
+                           env=dict(os.environ, HTMLER_INDENT_WIDTH='2'), capture_output=True, text=True,
+                           cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        assert r.stdout == f'<div>{linesep}  x{linesep}</div>{linesep}'
+
+    def test_layout_kinds(self):
+        """Layout kinds of node classes
+        """
+        base = htmler.base
+        for cls in _get_elements_classes():
+            if issubclass(cls, htmler.BlockElement):
+                assert cls._layout == base._LAYOUT_BLOCK
+            elif issubclass(cls, htmler.InlineElement):
+                assert cls._layout == base._LAYOUT_TEXT
+            else:
+                assert cls._layout == base._LAYOUT_OTHER
+
+        assert htmler.Text._layout == htmler.Comment._layout == htmler.Placeholder._layout == base._LAYOUT_TEXT
+        assert htmler.LazyChildren._layout == htmler.AsyncChildren._layout == htmler.Loop._layout == base._LAYOUT_LAZY
+
+        # Frozen and lazily produced nodes are laid out as the nodes they wrap and produce
+        def children():
+            return [htmler.B('b'), htmler.Div('c').freeze(), htmler.TagLessElement(htmler.I('d')), 'e']
+
+        expected = htmler.Div(*children()).render(indent=htmler.Indent(1, newline='\n'))
+        assert expected == '<div>\n <b>b</b>\n <div>\n  c\n </div>\n<i>d</i>e\n</div>\n'
+        assert htmler.Div().extend(children(), lazy=True).render(indent=htmler.Indent(1, newline='\n')) == expected
+
+    def test_binary(self, tmp_path, monkeypatch):
+        """Binary serialization
+        """
+        doc = _build_document()
+        data = htmler.dumps(doc)
+        copy = htmler.loads(data)
+        assert copy.render() == doc.render() and copy.render(minify=True) == doc.render(minify=True)
+        assert htmler.dumps(copy) == data
+        assert len(data) < len(pickle.dumps(doc))
+
+        nodes = [copy]
+        while nodes:
+            node = nodes.pop()
+            for child in node:
+                assert child.parent is node
+                nodes.append(child)
+
+        # Attributes' values keep their types, IDs of descendants are indexed
+        form = htmler.Form(
+            htmler.Input(id='name', css='a b', required=True, checked=False, maxlength=64, step=0.5, value=None),
+            htmler.Div(htmler.Span('x', id='inner'), 'x').freeze(),
+            htmler.Comment('note'),
+        )
+        copy = htmler.loads(htmler.dumps(form))
+        assert copy.render() == form.render()
+        assert copy.get_element_by_id('name').get_attr('maxlength') == 64
+        assert copy.get_element_by_id('name').get_attr('step') == 0.5
+        assert copy.get_element_by_id('name').get_attr('required') is True
+        frozen = list(copy)[1]
+        assert frozen.node.parent is None and frozen.render() == list(form)[1].render()
+        assert (copy.get_element_by_id('inner') is None) == (form.get_element_by_id('inner') is None)
+        copy.get_element_by_id('name').add_css('c')
+        assert not htmler.loads(htmler.dumps(form)).get_element_by_id('name').has_css('c')
+
+        # Subclasses are registered by their names, the registry is restored after the test
+        monkeypatch.setattr(htmler.binary, '_registry', dict(htmler.binary._registry))
+        monkeypatch.setattr(htmler.binary, '_names', dict(htmler.binary._names))
+
+        class Card(htmler.Div):
+            pass
+
+        with pytest.raises(TypeError):
+            htmler.dumps(Card('x'))
+        htmler.register_node_class(Card)
+        copy = htmler.loads(htmler.dumps(htmler.Section(Card('x'))))
+        assert list(copy)[0].__class__ is Card
+
+        card = Card('x')
+        card.note = 'y'
+        with pytest.raises(TypeError):
+            htmler.dumps(card)
+        with pytest.raises(TypeError):
+            htmler.register_node_class(htmler.LazyChildren)
+        with pytest.raises(TypeError):
+            htmler.dumps(htmler.Div().extend(['x'], lazy=True))
+        with pytest.raises(TypeError):
+            htmler.dumps(htmler.Div(title=object()))
+        with pytest.raises(ValueError):
+            htmler.loads(b'PICKLE' + data[6:])
+        with pytest.raises(ValueError):
+            htmler.loads(data[:len(data) // 2])
+
+        # Deep trees, which pickle cannot handle, are serialized too
+        deep = leaf = htmler.Div()
+        for _ in range(5000):
+            leaf = leaf.append_child(htmler.Div())
+        assert htmler.loads(htmler.dumps(deep)).render(indent=False) == deep.render(indent=False)
+
+        # Files are memory-mapped while loading, other streams are read
+        path = str(tmp_path / 'doc.bin')
+        with open(path, 'wb') as f:
+            htmler.dump(doc, f)
+        with open(path, 'rb') as f:
+            assert htmler.load(f).render() == doc.render()
+        f = io.BytesIO()
+        htmler.dump(doc, f)
+        f.seek(0)
+        assert htmler.load(f).render() == doc.render()
+
+    def test_subclass_hooks(self):
+        """Subclasses written for the former recursive renderer
+        """
+        class Raw(htmler.Element):
+            def render(self, **kwargs):
+                return '<raw/>'
+
+        class Shout(htmler.Div):
+            def render(self, **kwargs):
+                return super().render(**kwargs).upper()
+
+        class Marked(htmler.Div):
+            def _render_open_tag(self, **kwargs):
+                return super()._render_open_tag(**kwargs).replace('<marked', '<marked data-x="1"')
+
+        assert htmler.Body(Raw()).render(indent=False) == '<body><raw/></body>'
+        assert htmler.Body(Shout('a', htmler.B('b'))).render(indent=False) == '<body><SHOUT>A<B>B</B></SHOUT></body>'
+        assert htmler.Body(Shout('a')).render() == htmler.Body(htmler.Div('A')).render().replace('div', 'SHOUT')
+        assert htmler.Body(Marked('a')).render(indent=False) == '<body><marked data-x="1">a</marked></body>'
+        assert htmler.Body(Marked('a')).render(depth=1) == \
+            htmler.Body(htmler.Div('a', data={'x': '1'})).render(depth=1).replace('div', 'marked')
+
+        class Loud(htmler.Div):
+            def _render_children(self, **kwargs):
+                return super()._render_children(**kwargs).upper()
+
+        class Joined(htmler.Span):
+            def _render_children(self, **kwargs):
+                return '|'.join(child.render(**kwargs) for child in self.children)
+
+        assert htmler.Body(Loud('a', htmler.B('b'))).render(indent=False) == '<body><loud>A<B>B</B></loud></body>'
+        assert Loud('a', htmler.P('b')).render() == \
+            htmler.Div('A', htmler.P('B')).render().replace('div', 'loud').replace('p>', 'P>')
+        assert htmler.Body(Joined('a', htmler.B('b'))).render(indent=False) == \
+            '<body><joined>a|<b>b</b></joined></body>'
+        assert Joined('a', 'b').render(minify=True) == Joined('a', 'b').render(memoize=True) == '<joined>a|b</joined>'
+
+        # Minified rendering keeps the hooks of subclasses
+        class Upper(htmler.Div):
+            def _expand_children(self, indent, depth):
+                return [c.render(indent=False).upper() for c in self.children]
+
+        assert htmler.Body(Raw()).render(minify=True) == '<body><raw/></body>'
+        assert htmler.Body(Marked('a')).render(minify=True) == '<body><marked data-x="1">a</marked></body>'
+        assert htmler.Body(Upper('a', htmler.B('b'))).render(minify=True) == '<body><upper>A<B>B</B></upper></body>'